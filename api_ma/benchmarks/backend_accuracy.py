@@ -0,0 +1,92 @@
+"""Accuracy regression check of the ONNX / int8 backends against the fp32 PyTorch baseline.
+
+For every held-out query, compares the intent label of the classifier and
+the top-1 FAISS hit in the tag corpus and in the answer corpus of the query
+language. Exits with status 1 when the agreement of a backend falls below
+--min-agreement, and prints per-backend latency.
+
+    python benchmarks/backend_accuracy.py --backends onnx int8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+from services.backends import load_classifier, load_sentence_encoder
+from services.vector_store import load_corpus
+
+HELDOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "heldout_queries.json")
+# Loaded like the API does: {NAME}_VECTOR_STORE, else the legacy {NAME}_DATASET_PATH/{NAME}_FAISS_INDEX pair
+CORPORA = {
+    "tags": "TAGS",
+    "answers_fr": "ANSWERS_FR",
+    "answers_ar": "ANSWERS_AR",
+}
+
+
+def run_backend(backend, queries, indexes):
+    classifier = load_classifier(os.getenv("intent_classify_model_path"), backend, os.getenv("CLASSIFIER_ONNX_PATH"))
+    encoder = load_sentence_encoder(os.getenv("sentence_model_path"), backend, os.getenv("ENCODER_ONNX_PATH"))
+    results = {}
+    timings = {"classifier": 0.0, "encoder": 0.0}
+    for lang, texts in queries.items():
+        start = time.perf_counter()
+        labels = [classifier(text)[0]["label"] for text in texts]
+        timings["classifier"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts, convert_to_numpy=True, batch_size=1)
+        timings["encoder"] += time.perf_counter() - start
+
+        _, tag_hits = indexes["tags"].search(embeddings, 1)
+        _, answer_hits = indexes[f"answers_{lang}"].search(embeddings, 1)
+        for i, text in enumerate(texts):
+            results[(lang, text)] = {"label": labels[i], "tag": int(tag_hits[i][0]), "answer": int(answer_hits[i][0])}
+    n = sum(len(texts) for texts in queries.values())
+    return results, {name: value / n * 1000 for name, value in timings.items()}
+
+
+def agreement(baseline, candidate, field):
+    return sum(baseline[key][field] == candidate[key][field] for key in baseline) / len(baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inference backends against the fp32 baseline.")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "int8"], choices=["onnx", "int8"])
+    parser.add_argument("--queries", type=str, default=HELDOUT_PATH, help="JSON {lang: [queries]} held-out set.")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = json.load(f)
+    indexes = {name: load_corpus(corpus) for name, corpus in CORPORA.items()}
+
+    baseline, baseline_latency = run_backend("torch", queries, indexes)
+    report = {"torch": {"latency_ms": baseline_latency}}
+    failed = False
+    for backend in args.backends:
+        candidate, latency = run_backend(backend, queries, indexes)
+        scores = {field: agreement(baseline, candidate, field) for field in ("label", "tag", "answer")}
+        report[backend] = {"latency_ms": latency, "agreement": scores}
+        status = "OK" if min(scores.values()) >= args.min_agreement else "REGRESSION"
+        failed |= status != "OK"
+        print(f"{backend:5} labels {scores['label']:.1%}, top-1 tags {scores['tag']:.1%}, "
+              f"top-1 answers {scores['answer']:.1%} | classifier {latency['classifier']:.1f} ms "
+              f"(fp32 {baseline_latency['classifier']:.1f}), encoder {latency['encoder']:.1f} ms "
+              f"(fp32 {baseline_latency['encoder']:.1f}) -> {status}")
+        for key in baseline:
+            if baseline[key] != candidate[key]:
+                print(f"    [{key[0]}] {key[1]!r}: {baseline[key]} -> {candidate[key]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
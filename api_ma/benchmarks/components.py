@@ -0,0 +1,101 @@
+"""Microbenchmarks of the pipeline components, one query at a time on the calling thread.
+
+Measures correct_spelling_tokens, translation, the intent classifier, the
+sentence encoder and search (end to end, and the index lookup alone) over
+the corpora of benchmarks/corpora.py. Spelling and translation are measured
+with cold caches then warm caches, since production traffic sees both.
+
+    python benchmarks/components.py --per-lang 200 --output report.json --baseline benchmarks/components_baseline.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+from services.model_registry import DISABLED
+from benchmarks.corpora import build_corpus
+from benchmarks.report import add_baseline_arguments, check_against_baseline, make_report, print_results, save_report, summarize
+
+
+def measure(func, inputs, repeat=1):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            call_start = time.perf_counter()
+            try:
+                func(item)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def run_components(corpus, components):
+    # Imported here so that the corpus is built before the (slow) model loading starts
+    from services import functions
+    from services.functions import models
+
+    texts = {lang: [query["text"] for query in queries] for lang, queries in corpus.items()}
+    results = {}
+
+    if "spelling" in components and "fr" in texts:
+        speller = models.get("speller")
+        speller.words.clear()
+        speller.texts.clear()
+        results["spelling.cold"] = measure(functions.correct_spelling_tokens, texts["fr"])
+        results["spelling.warm"] = measure(functions.correct_spelling_tokens, texts["fr"])
+
+    if "translation" in components and "ar" in texts and models.status()["translator"]["state"] != DISABLED:
+        functions.translation.cache.clear()
+        results["translation.cold"] = measure(functions.translation, texts["ar"])
+        results["translation.warm"] = measure(functions.translation, texts["ar"])
+
+    if "classifier" in components and "fr" in texts:
+        # The classifier is French only, Arabic queries reach it translated
+        models.get("classifier")
+        results["classifier"] = measure(functions.nlp_pipeline_class, texts["fr"])
+
+    if "encoder" in components:
+        for lang, lang_texts in texts.items():
+            results[f"encoder.{lang}"] = measure(functions.encoder, lang_texts)
+
+    if "search" in components:
+        for lang, lang_texts in texts.items():
+            index_name = functions.ANSWER_INDEXES[lang]
+            with models.get(index_name).use() as store:
+                results[f"search.{lang}"] = measure(lambda text: functions.search(text, store, 1, lang), lang_texts)
+                embeddings = [functions.encoder(text) for text in lang_texts]
+                results[f"search.{lang}.index_only"] = measure(lambda embedding: store.get_nearest_examples(embedding, k=1),
+                                                               embeddings)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the pipeline components.")
+    parser.add_argument("--per-lang", type=int, default=200, help="Queries per language.")
+    parser.add_argument("--langs", nargs="+", default=["fr", "ar"], choices=["fr", "ar"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--components", nargs="+", default=["spelling", "translation", "classifier", "encoder", "search"],
+                        choices=["spelling", "translation", "classifier", "encoder", "search"])
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.per_lang, args.langs, args.seed)
+    results = run_components(corpus, args.components)
+    report = make_report("components", results, per_lang=args.per_lang, seed=args.seed,
+                         backend=os.getenv("INFERENCE_BACKEND", "torch"))
+    print_results(report)
+    if args.output:
+        save_report(report, args.output)
+    if args.baseline and not check_against_baseline(report, args.baseline, args.tolerance, args.min_delta_ms):
+        sys.exit(1)
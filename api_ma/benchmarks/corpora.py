@@ -0,0 +1,97 @@
+"""French and Arabic query corpora for the benchmarks, derived from datasets/.
+
+General questions are the opening words of the answers in data_fr.json and
+data_ar.json, data requests wrap the tags of tags.json in the phrasings
+users type ("je cherche les données sur ..."), and a share of the French
+queries gets a typo so that spelling correction is exercised. The corpus is
+deterministic for a given seed, so two benchmark runs send the same queries.
+
+    python benchmarks/corpora.py --per-lang 500 --output benchmarks/queries.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS_DIR = os.path.join(API_DIR, "datasets")
+
+DATA_REQUEST_TEMPLATES = {
+    "fr": [
+        "je cherche les données sur {}",
+        "données {}",
+        "où trouver des statistiques sur {} ?",
+        "avez-vous un jeu de données concernant {}",
+    ],
+    "ar": [
+        "أريد بيانات حول {}",
+        "أبحث عن معطيات {}",
+        "هل توجد إحصائيات حول {}؟",
+    ],
+}
+SENTENCE_END = re.compile(r"[.!?؟:;،,]")
+
+
+def load_json(name):
+    with open(os.path.join(DATASETS_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def question_from_answer(answer, rng, min_words=4, max_words=14):
+    """The first clause of an answer, cut to a question-sized number of words."""
+    clause = SENTENCE_END.split(answer, 1)[0]
+    words = clause.split()
+    return " ".join(words[:rng.randint(min_words, max_words)])
+
+
+def add_typo(text, rng):
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) > 4 and word.isalpha()]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    word = words[i]
+    j = rng.randrange(1, len(word) - 1)
+    # Swap two neighbouring letters, the most common typing mistake
+    words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return " ".join(words)
+
+
+def build_queries(lang, n, seed=0, data_request_share=0.5, typo_rate=0.2):
+    """n queries of lang as dicts {"text", "lang", "kind"}, kind being "general" or "data"."""
+    rng = random.Random(f"{seed}-{lang}")
+    answers = [answer for answer in load_json(f"data_{lang}.json") if answer.strip()]
+    tags = load_json("tags.json")
+    queries = []
+    for _ in range(n):
+        if rng.random() < data_request_share:
+            text = rng.choice(DATA_REQUEST_TEMPLATES[lang]).format(rng.choice(tags))
+            kind = "data"
+        else:
+            text = question_from_answer(rng.choice(answers), rng)
+            kind = "general"
+        if lang == "fr" and rng.random() < typo_rate:
+            text = add_typo(text, rng)
+        queries.append({"text": text, "lang": lang, "kind": kind})
+    return queries
+
+
+def build_corpus(per_lang, langs=("fr", "ar"), seed=0, data_request_share=0.5, typo_rate=0.2):
+    return {lang: build_queries(lang, per_lang, seed, data_request_share, typo_rate) for lang in langs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the benchmark query corpora from datasets/.")
+    parser.add_argument("--per-lang", type=int, default=500)
+    parser.add_argument("--langs", nargs="+", default=["fr", "ar"], choices=["fr", "ar"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-request-share", type=float, default=0.5)
+    parser.add_argument("--typo-rate", type=float, default=0.2, help="Share of French queries with a typo.")
+    parser.add_argument("--output", type=str, default=os.path.join(API_DIR, "benchmarks", "queries.json"))
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.per_lang, args.langs, args.seed, args.data_request_share, args.typo_rate)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=2)
+    print(f"{sum(len(q) for q in corpus.values())} queries written to {args.output}")
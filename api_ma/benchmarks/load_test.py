@@ -0,0 +1,187 @@
+"""End-to-end load test of the API: throughput and p50/p95/p99 per endpoint under concurrency.
+
+Sends the queries of benchmarks/corpora.py from --concurrency clients, each
+waiting for its answer before sending the next query (closed loop). With
+--start-api the API is started through run_api.sh against a local CKAN
+stub (utils/ckan_stub.py), so the run is offline and its CKAN latency is
+controlled, and with an in-memory CKAN cache so that stub results never
+reach the shared SQLite cache; otherwise --url points to an API that is
+already running. general_qst is only loaded with --general-token, the
+token of a corpus that has general questions.
+
+    python benchmarks/load_test.py --start-api --concurrency 16 --duration 60 --output report.json \
+        --baseline benchmarks/load_baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+load_dotenv("tokens.env")
+
+from benchmarks.corpora import build_corpus, load_json
+from benchmarks.report import add_baseline_arguments, check_against_baseline, make_report, print_results, save_report, summarize
+from benchmarks.rss_per_worker import wait_until_ready
+from utils.ckan_stub import start_stub_server
+
+ENDPOINTS = ["classify_intent_v4", "gener_v1", "req_data_v2", "general_qst"]
+
+
+def payload_for(endpoint, query, token, general_token=None):
+    if endpoint == "general_qst":
+        return {"text": query["text"], "token": general_token}
+    return {"text": query["text"], "lang": query["lang"], "token": token}
+
+
+def build_workload(corpus, endpoints):
+    """(endpoint, query) pairs cycled by the clients: general questions go to the general
+    endpoints, data requests to req_data_v2, and classify_intent_v4 gets everything."""
+    workload = []
+    for lang, queries in corpus.items():
+        for query in queries:
+            for endpoint in endpoints:
+                if endpoint == "req_data_v2" and query["kind"] != "data":
+                    continue
+                if endpoint == "gener_v1" and query["kind"] != "general":
+                    continue
+                if endpoint == "general_qst" and (query["kind"] != "general" or lang != "fr"):
+                    continue
+                workload.append((endpoint, query))
+    return workload
+
+
+async def run_load(url, workload, concurrency, duration, max_requests, api_key, token, general_token, timeout, warmup):
+    latencies = defaultdict(list)
+    errors = Counter()
+    statuses = defaultdict(Counter)
+    queue = itertools.cycle(workload)
+    sent = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits, headers={"X-Api-Key": api_key}) as client:
+
+        async def send(endpoint, query):
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/api/{endpoint}", json=payload_for(endpoint, query, token, general_token))
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            return status, time.perf_counter() - start
+
+        # Warm up the caches and the lazy models without recording anything
+        await asyncio.gather(*(send(*item) for item in workload[:warmup]))
+
+        deadline = time.monotonic() + duration if duration else None
+        started = time.perf_counter()
+
+        async def client_loop():
+            nonlocal sent
+            while (deadline is None or time.monotonic() < deadline) and (max_requests is None or sent < max_requests):
+                sent += 1
+                endpoint, query = next(queue)
+                status, latency = await send(endpoint, query)
+                statuses[endpoint][str(status)] += 1
+                if status == 200:
+                    latencies[endpoint].append(latency)
+                else:
+                    errors[endpoint] += 1
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint in sorted(statuses):
+        results[endpoint] = {**summarize(latencies[endpoint], errors[endpoint], elapsed),
+                             "statuses": dict(statuses[endpoint])}
+    results["all"] = summarize([l for values in latencies.values() for l in values], sum(errors.values()), elapsed)
+    return results
+
+
+def start_api(port, stub_url, timeout, metrics_dir):
+    # The stub results must not land in the SQLite cache served to real users, and run_api.sh
+    # empties PROMETHEUS_MULTIPROC_DIR, which must not be the one of a running API
+    env = dict(os.environ, PORT=str(port), CKAN_BASE_URL=stub_url, CKAN_CACHE_BACKEND="memory",
+               PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+    process = subprocess.Popen(["bash", "run_api.sh"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_ready(f"http://127.0.0.1:{port}/ready", process, timeout)
+    return process
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test of the API endpoints.")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:5000", help="API to load, ignored with --start-api.")
+    parser.add_argument("--start-api", action="store_true", help="Start run_api.sh against a local CKAN stub.")
+    parser.add_argument("--port", type=int, default=5056, help="Port of the API started with --start-api.")
+    parser.add_argument("--ready-timeout", type=int, default=600, help="Seconds to wait for the models to load.")
+    parser.add_argument("--stub-latency-ms", type=float, default=80, help="Latency of the CKAN stub.")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of CKAN stub responses that fail.")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--per-lang", type=int, default=300, help="Queries per language.")
+    parser.add_argument("--langs", nargs="+", default=["fr", "ar"], choices=["fr", "ar"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load, 0 to use --requests.")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests.")
+    parser.add_argument("--warmup", type=int, default=20, help="Requests sent before measuring.")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--api-key", type=str, default=os.getenv("API_KEY"))
+    parser.add_argument("--token", type=str, default=os.getenv("open_data"))
+    parser.add_argument("--general-token", type=str, default=None,
+                        help="Token of a corpus with general questions, general_qst is skipped without it.")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("Set --duration or --requests")
+
+    endpoints = args.endpoints
+    if "general_qst" in endpoints and not args.general_token:
+        # Any other token answers general_qst with its error message, and a 200
+        print("No --general-token, skipping general_qst")
+        endpoints = [endpoint for endpoint in endpoints if endpoint != "general_qst"]
+
+    corpus = build_corpus(args.per_lang, args.langs, args.seed)
+    workload = build_workload(corpus, endpoints)
+
+    process = None
+    metrics_dir = None
+    url = args.url
+    try:
+        if args.start_api:
+            tags = load_json("tags.json")
+            stub, stub_url = start_stub_server(latency_ms=args.stub_latency_ms, error_rate=args.stub_error_rate, tags=tags)
+            print(f"CKAN stub on {stub_url}, starting the API on port {args.port}")
+            metrics_dir = tempfile.mkdtemp(prefix="load_test_metrics_")
+            process = start_api(args.port, stub_url, args.ready_timeout, metrics_dir)
+            url = f"http://127.0.0.1:{args.port}"
+        results = asyncio.run(run_load(url, workload, args.concurrency, args.duration, args.requests, args.api_key,
+                                       args.token, args.general_token, args.timeout, args.warmup))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    report = make_report("load", results, concurrency=args.concurrency, duration=args.duration, per_lang=args.per_lang,
+                         seed=args.seed, stub_latency_ms=args.stub_latency_ms if args.start_api else None)
+    print_results(report)
+    if args.output:
+        save_report(report, args.output)
+    if args.baseline and not check_against_baseline(report, args.baseline, args.tolerance, args.min_delta_ms):
+        sys.exit(1)
@@ -0,0 +1,115 @@
+"""Latency summaries shared by the benchmarks, and their comparison against a stored baseline.
+
+A report is a JSON object {"meta": {...}, "results": {name: summary}}, a
+summary holding count, errors, throughput_rps and the mean/p50/p95/p99
+latencies in milliseconds.
+
+    python benchmarks/report.py new.json --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+
+def summarize(latencies, errors=0, elapsed=None):
+    """Summary of latencies in seconds; throughput counts successes over elapsed seconds."""
+    samples = sorted(latencies)
+    summary = {
+        "count": len(samples),
+        "errors": errors,
+        "error_rate": errors / (len(samples) + errors) if samples or errors else 0.0,
+        "mean_ms": sum(samples) / len(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+    if elapsed:
+        summary["throughput_rps"] = len(samples) / elapsed
+    return summary
+
+
+def make_report(kind, results, **meta):
+    meta = {"kind": kind, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+            "python": platform.python_version(), **meta}
+    return {"meta": meta, "results": results}
+
+
+def save_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=0.15, min_delta_ms=2.0, max_error_rate_increase=0.01):
+    """Regressions of report against baseline, as a list of (name, metric, baseline value, new value).
+
+    A latency regresses when it grows by more than tolerance and by more
+    than min_delta_ms (sub-millisecond stages are mostly noise), throughput
+    when it drops by more than tolerance.
+    """
+    regressions = []
+    for name, old in baseline["results"].items():
+        new = report["results"].get(name)
+        if new is None:
+            continue
+        for key in LATENCY_KEYS:
+            if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] > min_delta_ms:
+                regressions.append((name, key, old[key], new[key]))
+        if "throughput_rps" in old and "throughput_rps" in new:
+            if new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                regressions.append((name, "throughput_rps", old["throughput_rps"], new["throughput_rps"]))
+        if new["error_rate"] > old["error_rate"] + max_error_rate_increase:
+            regressions.append((name, "error_rate", old["error_rate"], new["error_rate"]))
+    return regressions
+
+
+def print_results(report):
+    for name, summary in report["results"].items():
+        throughput = f", {summary['throughput_rps']:.1f} req/s" if "throughput_rps" in summary else ""
+        print(f"{name:32} n={summary['count']:<6} p50 {summary['p50_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms  "
+              f"p99 {summary['p99_ms']:8.1f} ms  errors {summary['error_rate']:.1%}{throughput}")
+
+
+def check_against_baseline(report, baseline_path, tolerance, min_delta_ms):
+    """Print the regressions against the baseline file and return True when there are none."""
+    regressions = compare(report, load_report(baseline_path), tolerance, min_delta_ms)
+    for name, key, old, new in regressions:
+        print(f"REGRESSION {name} {key}: {old:.2f} -> {new:.2f}")
+    if not regressions:
+        print(f"No regression against {baseline_path} (tolerance {tolerance:.0%})")
+    return not regressions
+
+
+def add_baseline_arguments(parser):
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against this report, exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative change allowed before flagging.")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore latency changes smaller than this.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a benchmark report against a baseline.")
+    parser.add_argument("report", type=str)
+    parser.add_argument("--baseline", type=str, required=True)
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    report = load_report(args.report)
+    print_results(report)
+    sys.exit(0 if check_against_baseline(report, args.baseline, args.tolerance, args.min_delta_ms) else 1)
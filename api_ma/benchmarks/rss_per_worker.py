@@ -0,0 +1,92 @@
+"""Measure per-process memory of the API for each serving mode.
+
+Starts run_api.sh with the given SERVING_MODE, waits for /ready, then
+reports RSS, USS and PSS of the master and of every worker. USS is the
+memory private to a process; PSS splits shared pages between the processes
+that map them, so the PSS total is the real RAM cost of the deployment.
+
+    python benchmarks/rss_per_worker.py --modes preload uvicorn --workers 2 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+import urllib.request
+import psutil
+
+MB = 1024 * 1024
+
+
+def wait_until_ready(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The API exited with code {process.returncode} before becoming ready")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return time.monotonic()
+        except Exception:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def memory_of(process):
+    try:
+        info = process.memory_full_info()
+        return {"pid": process.pid, "rss_mb": info.rss / MB, "uss_mb": info.uss / MB, "pss_mb": getattr(info, "pss", 0) / MB}
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+
+def measure(mode, workers, port, timeout):
+    env = dict(os.environ, SERVING_MODE=mode, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    started = time.monotonic()
+    process = subprocess.Popen(["bash", "run_api.sh"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = wait_until_ready(f"http://127.0.0.1:{port}/ready", process, timeout)
+        # Give the remaining workers a moment to finish starting
+        time.sleep(5)
+        root = psutil.Process(process.pid)
+        processes = [memory_of(root)] + [memory_of(child) for child in root.children(recursive=True)]
+        processes = [p for p in processes if p is not None]
+        return {
+            "mode": mode,
+            "workers": workers,
+            "cold_start_s": ready - started,
+            "processes": processes,
+            "total_rss_mb": sum(p["rss_mb"] for p in processes),
+            "total_pss_mb": sum(p["pss_mb"] for p in processes),
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-process memory of the API by serving mode.")
+    parser.add_argument("--modes", nargs="+", default=["preload", "uvicorn"], choices=["preload", "uvicorn"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[2])
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds to wait for the models to load.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    report = []
+    for mode in args.modes:
+        for workers in args.workers:
+            result = measure(mode, workers, args.port, args.timeout)
+            report.append(result)
+            print(f"{mode:8} workers={workers}: cold start {result['cold_start_s']:.1f}s, "
+                  f"RSS total {result['total_rss_mb']:.0f} MB, PSS total {result['total_pss_mb']:.0f} MB")
+            for p in result["processes"]:
+                print(f"    pid {p['pid']}: RSS {p['rss_mb']:.0f} MB, USS {p['uss_mb']:.0f} MB, PSS {p['pss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,116 @@
+"""Recall@k and latency of the vector store index types against the legacy flat L2 search.
+
+Each corpus is rebuilt from the vectors of its store ({NAME}_VECTOR_STORE,
+or the legacy {NAME}_FAISS_INDEX when no store was built) as flat, IVF and
+HNSW cosine stores. Queries are the held-out queries when --encode is given
+(needs the sentence model), otherwise corpus vectors with gaussian noise.
+--scale grows a corpus with noisy copies of its vectors to see how the
+approximate indexes behave on larger datasets.
+
+    python benchmarks/vector_store_bench.py --corpora TAGS ANSWERS_FR --scale 100000 -k 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+from services.vector_store import INDEX_TYPES, VectorStore, configure_search, normalize
+
+HELDOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "heldout_queries.json")
+
+
+def load_vectors(name, scale, rng):
+    prefix = os.getenv(f"{name}_VECTOR_STORE")
+    if VectorStore.exists(prefix):
+        # Not memory-mapped: IVF indexes need a direct map to reconstruct their rows
+        vectors = VectorStore.load(prefix, mmap=False, name=name).vectors()
+    else:
+        legacy = faiss.read_index(os.getenv(f"{name}_FAISS_INDEX"))
+        vectors = legacy.reconstruct_n(0, legacy.ntotal)
+    if scale > len(vectors):
+        picks = rng.integers(0, len(vectors), scale - len(vectors))
+        noise = rng.normal(0, vectors.std() * 0.3, (len(picks), vectors.shape[1])).astype("float32")
+        vectors = np.vstack([vectors, vectors[picks] + noise])
+    return vectors
+
+
+def load_queries(vectors, n_queries, encode, rng):
+    if encode:
+        from sentence_transformers import SentenceTransformer
+
+        with open(HELDOUT_PATH, "r", encoding="utf-8") as f:
+            texts = [text for lang_texts in json.load(f).values() for text in lang_texts]
+        return SentenceTransformer(os.getenv("sentence_model_path")).encode(texts, convert_to_numpy=True)
+    picks = rng.integers(0, len(vectors), n_queries)
+    noise = rng.normal(0, vectors.std() * 0.5, (n_queries, vectors.shape[1])).astype("float32")
+    return vectors[picks] + noise
+
+
+def recall(expected, found):
+    return float(np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)]))
+
+
+def latency(index, queries, k):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def bench_corpus(name, args, rng):
+    vectors = load_vectors(name, args.scale, rng)
+    queries = load_queries(vectors, args.queries, args.encode, rng)
+    texts = [""] * len(vectors)
+
+    legacy = faiss.IndexFlatL2(vectors.shape[1])
+    legacy.add(vectors)
+    _, l2_ids = legacy.search(queries, args.k)
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(normalize(vectors))
+    _, cosine_ids = exact.search(normalize(queries), args.k)
+
+    rows = [{"index": "legacy_l2", **latency(legacy, queries, args.k)}]
+    for index_type in args.index_types:
+        start = time.perf_counter()
+        store = VectorStore.build(vectors, texts, index_type)
+        build_s = time.perf_counter() - start
+        configure_search(store.index, args.nprobe, args.ef_search)
+        _, ids = store.search(queries, args.k)
+        rows.append({
+            "index": index_type,
+            "build_s": build_s,
+            f"recall@{args.k}_vs_l2": recall(l2_ids, ids),
+            f"recall@{args.k}_vs_cosine": recall(cosine_ids, ids),
+            **latency(store.index, normalize(queries), args.k),
+        })
+    return {"corpus": name, "rows": len(vectors), "queries": len(queries), "results": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vector store index types.")
+    parser.add_argument("--corpora", nargs="+", default=["TAGS", "ANSWERS_FR", "ANSWERS_AR"])
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500, help="Number of synthetic queries.")
+    parser.add_argument("--encode", action="store_true", help="Use the encoded held-out queries instead.")
+    parser.add_argument("--scale", type=int, default=0, help="Grow each corpus to this many vectors.")
+    parser.add_argument("--nprobe", type=int, default=int(os.getenv("VECTOR_NPROBE", "16")))
+    parser.add_argument("--ef-search", type=int, default=int(os.getenv("VECTOR_EF_SEARCH", "64")))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    report = [bench_corpus(name, args, rng) for name in args.corpora]
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+import spacy
+from spellchecker import SpellChecker
+from dotenv import load_dotenv
+from services.spelling import SKIP_TOKEN
+from utils.logging_config import logger
+import warnings
+
+# Ignore all warnings
+warnings.filterwarnings("ignore")
+
+try:
+    load_dotenv('config.env')
+except Exception as e:
+    logger.error(f" {e}")
+    sys.exit(1)
+
+spell = SpellChecker(language='fr')
+
+
+def load_texts(path_data):
+    """Load the texts of a JSON dataset (list of strings or of {"text": ...} records)."""
+    with open(path_data, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [item["text"] if isinstance(item, dict) else item for item in data]
+
+
+def collect_vocabulary(paths):
+    """Tokenize every corpus with the same tokenizer as the API and return the words to correct."""
+    tokenizer = spacy.load("fr_core_news_md").tokenizer
+    vocabulary = set()
+    for path in paths:
+        for doc in tokenizer.pipe(load_texts(path)):
+            for token in doc:
+                vocabulary.update(token.text.split())
+    return sorted(word for word in vocabulary if not SKIP_TOKEN.match(word) and not spell.known([word]))
+
+
+def correct(word):
+    return word, spell.correction(word)
+
+
+def build_table(paths, output, workers):
+    try:
+        words = collect_vocabulary(paths)
+        logger.info(f"Computing corrections for {len(words)} unknown words with {workers} workers")
+        with Pool(workers) as pool:
+            table = {word: correction for word, correction in pool.imap_unordered(correct, words, chunksize=64)
+                     if correction is not None}
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(table, f, ensure_ascii=False)
+        os.replace(tmp_path, output)
+        logger.info(f"Correction table with {len(table)} entries written to {output}")
+    except Exception as e:
+        logger.error(f"An error occurred while building the correction table: {e}")
+        print(f"An error occurred: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute French spelling corrections for the corpus vocabulary.")
+    parser.add_argument("--output", type=str, default=os.getenv("SPELL_TABLE_PATH", "./datasets/spell_table_fr.json"),
+                        help="Path of the correction table to write.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("paths", type=str, nargs="*",
+                        default=[os.getenv("TAGS_DATASET_PATH"), os.getenv("ANSWERS_FR_DATASET_PATH")],
+                        help="JSON datasets to take the vocabulary from.")
+    args = parser.parse_args()
+
+    build_table(args.paths, args.output, args.workers)
@@ -1,15 +1,31 @@
 import os
-from dotenv import load_dotenv
+from dotenv import dotenv_values
 from utils.logging_config import logger
 from cryptography.fernet import Fernet
-import asyncio
-from watchdog.observers import Observer
-from utils.file_watcher import TokenFileHandler
-from core.token_manager import update_current_valid_token, update_cipher_suite
-from watchdog.observers.polling import PollingObserver
+from utils.file_watcher import ConfigWatcher
+from core.token_manager import update_current_valid_token, update_cipher_suite, get_cipher_suite, update_api_key
+from core.security import decrypt_string
 
 fernet_key = None
 API_KEY = None
+# Variables each env file set, which a reload of the file may change
+env_file_values = {}
+
+
+def load_env_file(path):
+    """Apply path to os.environ, overriding the values it set before.
+
+    Like load_dotenv(override=True), except that variables set in the process
+    environment keep precedence over the file, as in run_api.sh.
+    """
+    previous = env_file_values.get(path, {})
+    values = {key: value for key, value in dotenv_values(path).items() if value is not None}
+    for key, value in values.items():
+        if key not in os.environ or os.environ[key] == previous.get(key, value):
+            os.environ[key] = value
+        else:
+            values[key] = previous.get(key)
+    env_file_values[path] = {key: value for key, value in values.items() if value is not None}
 
 
 
@@ -17,8 +33,8 @@ async def load_configuration():
     global fernet_key, API_KEY
     
     try:
-        load_dotenv("config.env")
-        load_dotenv("tokens.env")
+        load_env_file("config.env")
+        load_env_file("tokens.env")
     except Exception as e:
         logger.error(f"Failed to load environment variables: {e}")
         raise
@@ -35,6 +51,7 @@ async def load_configuration():
         
         cipher_suite = Fernet(fernet_key)
         update_cipher_suite(cipher_suite)
+        update_api_key(API_KEY)
         logger.info("Configuration loaded successfully.")
     
     except ValueError as ve:
@@ -47,6 +64,7 @@ async def load_configuration():
 async def initialize_tokens():
     env_file = "tokens.env"
     new_tokens = {}
+    corpora = {}
 
     try:
         # Open the tokens.env file and read lines
@@ -62,8 +80,16 @@ async def initialize_tokens():
 
         if not new_tokens:
             logger.warning("No tokens found in tokens.env")
-        
-        update_current_valid_token(new_tokens)
+
+        # Decrypt each token once here, requests then resolve their corpus with a dict lookup
+        cipher_suite = get_cipher_suite()
+        for key, token in new_tokens.items():
+            try:
+                corpora[key] = decrypt_string(token, cipher_suite)
+            except Exception as e:
+                logger.error(f"Token '{key}' could not be decrypted with FERNET_KEY and is ignored: {e}")
+
+        update_current_valid_token(new_tokens, corpora)
 
     except FileNotFoundError:
         logger.error(f"{env_file} not found.")
@@ -72,15 +98,15 @@ async def initialize_tokens():
 
 
 
-async def start_file_watcher():
-    event_handler = TokenFileHandler(initialize_tokens, load_configuration)
-    observer = PollingObserver()
-    observer.schedule(event_handler, path='/app', recursive=False)
-    observer.start()
+async def reload_configuration():
+    await load_configuration()
+    # The tokens are decrypted with FERNET_KEY, which may have changed
+    await initialize_tokens()
 
-    try:
-        while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+
+# config.env also carries the index paths, see the listener registered in main.py
+config_watcher = ConfigWatcher(
+    {"config.env": reload_configuration, "tokens.env": initialize_tokens},
+    directory=os.getenv("CONFIG_DIR", "."),
+    debounce=float(os.getenv("CONFIG_RELOAD_DEBOUNCE", "1")),
+)
@@ -1,13 +1,17 @@
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from fastapi.security import APIKeyHeader
+import hmac
 import os
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 from utils.logging_config import logger
+from core.token_manager import get_current_valid_token, lookup_token, get_api_key, update_api_key
 
 try:
     load_dotenv("config.env")
     API_KEY = os.getenv("API_KEY")
+    # Replaced by load_configuration when config.env is reloaded
+    update_api_key(API_KEY)
 except Exception as e:
     logger.error(f"Failed to load environment variables: {e}")
     raise Exception(f"Failed to load environment variables: {e}")
@@ -26,6 +30,34 @@ def decrypt_string(encrypted_text, cipher_suite):
     return decrypted_text
 
 async def verify_api_key(api_key: str = Depends(api_key_header)):
-    if api_key != API_KEY:
+    expected = get_api_key()
+    if expected is None or not hmac.compare_digest(api_key.encode("utf-8"), expected.encode("utf-8")):
         raise HTTPException(status_code=403, detail="Forbidden")
-    return api_key
\ No newline at end of file
+    return api_key
+
+
+def authenticated(model, token_key="open_data"):
+    """Dependency parsing the request body as model and checking its token.
+
+    With token_key, the token must be the one stored under that key in
+    tokens.env; with token_key=None any valid token is accepted. The corpus
+    name of the token is put on request.state.token_corpus.
+    """
+    async def dependency(body: model, http_request: Request):
+        client_ip = http_request.client.host
+        if token_key is not None and token_key not in get_current_valid_token():
+            logger.error(f"Token key '{token_key}' not found from client ip {client_ip}")
+            raise HTTPException(status_code=403, detail="Token not found")
+
+        entry = lookup_token(body.token)
+        if token_key is None and entry is None:
+            logger.error(f"Unknown token from IP: {client_ip}")
+            raise HTTPException(status_code=403, detail="Could not authenticate token")
+        if token_key is not None and (entry is None or entry[0] != token_key):
+            logger.error(f"Invalid token received from client IP {client_ip}")
+            raise HTTPException(status_code=403, detail="Invalid token")
+
+        http_request.state.token_corpus = entry[1]
+        return body
+
+    return dependency
\ No newline at end of file
@@ -1,19 +1,50 @@
 # token_manager.py
+import hashlib
+import hmac
+
 current_valid_token = {}
+# sha256(token) -> (token, key in tokens.env, corpus name), rebuilt on every reload of tokens.env
+token_index = {}
 cipher_suite = None
+api_key = None
 
 
 def get_current_valid_token():
     return current_valid_token
 
-def update_current_valid_token(new_tokens):
-    global current_valid_token
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def update_current_valid_token(new_tokens, corpora=None):
+    """Swap in the tokens of tokens.env; corpora maps a key to the corpus name its token decrypts to."""
+    global current_valid_token, token_index
+    corpora = corpora or {}
+    token_index = {token_digest(token): (token, key, corpora[key]) for key, token in new_tokens.items() if key in corpora}
     current_valid_token = new_tokens
 
+def lookup_token(token):
+    """(key, corpus name) of a valid token, or None.
+
+    The dict is keyed on the digest of the token, and the stored token is then
+    compared in constant time, so the lookup time does not depend on how many
+    leading characters of a guess are right.
+    """
+    entry = token_index.get(token_digest(token))
+    if entry is None or not hmac.compare_digest(entry[0].encode("utf-8"), token.encode("utf-8")):
+        return None
+    return entry[1], entry[2]
+
 
 def get_cipher_suite():
     return cipher_suite
 
 def update_cipher_suite(new_cipher_suite):
     global cipher_suite
-    cipher_suite = new_cipher_suite
\ No newline at end of file
+    cipher_suite = new_cipher_suite
+
+def get_api_key():
+    return api_key
+
+def update_api_key(new_api_key):
+    global api_key
+    api_key = new_api_key
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends
+from core.security import verify_api_key
+from core.config import config_watcher
+from services.functions import encoder, models, translation, indexes, answer_cache
+from services.ckan_client import ckan_client
+
+router = APIRouter()
+
+
+@router.get("/admin/stats")
+async def admin_stats(api_key: str = Depends(verify_api_key)):
+    return {
+        "encoder": encoder.stats(),
+        "spelling": models.peek("speller").stats() if models.peek("speller") is not None else None,
+        "translation": translation.stats(),
+        "ckan_cache": ckan_client.cache.stats() if ckan_client.cache is not None else None,
+        "answer_cache": answer_cache.stats(),
+    }
+
+
+@router.get("/admin/indexes")
+async def admin_indexes(api_key: str = Depends(verify_api_key)):
+    """Active version of each tag and answer index, and the versions still serving in-flight searches."""
+    return indexes.status()
+
+
+@router.post("/admin/indexes/refresh")
+async def admin_indexes_refresh(api_key: str = Depends(verify_api_key)):
+    """Rebuild the indexes whose files changed, for file systems where change events are not delivered."""
+    await asyncio.to_thread(indexes.refresh_all)
+    return indexes.status()
+
+
+@router.post("/admin/config/reload")
+async def admin_config_reload(broadcast: bool = True, api_key: str = Depends(verify_api_key)):
+    """Reload tokens.env and config.env in this worker, then touch them so every other worker reloads them too."""
+    reloaded = await config_watcher.reload()
+    if broadcast:
+        config_watcher.broadcast()
+    return {"reloaded": reloaded, "pid": os.getpid(), "broadcast": broadcast}
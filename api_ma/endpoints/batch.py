@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from fastapi.responses import StreamingResponse
+from schemas import BatchClassifyRequest, BatchSearchRequest
+from core.security import verify_api_key, authenticated
+from services.functions import classify_intent_batch, search_batch, enabled_languages
+from services.executor import inference_executor, server_timing, QueueFullError
+from utils.logging_config import logger
+from utils.request_context import annotate, set_lang
+import json
+import os
+
+router = APIRouter()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+# Each chunk is one job of the inference executor, and one line group of a streamed response
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "64"))
+
+
+def check_batch(texts, lang):
+    if not texts:
+        raise HTTPException(status_code=400, detail="A batch must contain at least one text")
+    if len(texts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch must contain at most {BATCH_MAX_ITEMS} texts")
+
+    if lang not in enabled_languages:
+        raise HTTPException(status_code=400, detail=f"Language '{lang}' is not enabled")
+
+
+async def run_chunks(func, texts, *args):
+    """Run func on consecutive chunks of texts, yielding (offset, results, timings)."""
+    for start in range(0, len(texts), BATCH_CHUNK_SIZE):
+        results, timings = await inference_executor.run(func, texts[start:start + BATCH_CHUNK_SIZE], *args)
+        yield start, results, timings
+
+
+async def ndjson_lines(func, texts, *args):
+    try:
+        async for start, results, _ in run_chunks(func, texts, *args):
+            for i, result in enumerate(results):
+                yield json.dumps({"index": start + i, **result}, ensure_ascii=False) + "\n"
+    except QueueFullError:
+        logger.warning("Inference queue full, batch stream stopped")
+        yield json.dumps({"error": "Server busy, retry later"}) + "\n"
+    except Exception as e:
+        logger.exception(f"Unexpected error in batch stream: {e}")
+        yield json.dumps({"error": "Internal Server Error"}) + "\n"
+
+
+async def batch_response(func, texts, response, stream, *args):
+    annotate(items=len(texts), streaming=stream)
+    if stream:
+        return StreamingResponse(ndjson_lines(func, texts, *args), media_type="application/x-ndjson")
+
+    items = []
+    queue_wait = compute = 0.0
+    async for _, results, timings in run_chunks(func, texts, *args):
+        items.extend(results)
+        queue_wait += timings["queue_wait"]
+        compute += timings["compute"]
+    response.headers["Server-Timing"] = server_timing({"queue_wait": queue_wait, "compute": compute})
+    return {"results": items}
+
+
+@router.post("/batch/classify")
+async def batch_classify(http_request: Request, response: Response, api_key: str = Depends(verify_api_key),
+                         request: BatchClassifyRequest = Depends(authenticated(BatchClassifyRequest))):
+    try:
+        set_lang(request.lang)
+        check_batch(request.texts, request.lang)
+        return await batch_response(classify_intent_batch, request.texts, response, request.stream, request.lang)
+
+    except QueueFullError as e:
+        logger.warning(f"Inference queue full, rejecting request from IP: {http_request.client.host}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Unexpected error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/batch/search")
+async def batch_search(http_request: Request, response: Response, api_key: str = Depends(verify_api_key),
+                       request: BatchSearchRequest = Depends(authenticated(BatchSearchRequest))):
+    try:
+        set_lang(request.lang)
+        check_batch(request.texts, request.lang)
+        if request.index not in ("answers", "tags") or not 1 <= request.k <= 50:
+            raise HTTPException(status_code=400, detail="Invalid request data")
+        return await batch_response(search_batch, request.texts, response, request.stream,
+                                    request.lang, request.index, request.k)
+
+    except QueueFullError as e:
+        logger.warning(f"Inference queue full, rejecting request from IP: {http_request.client.host}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Unexpected error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
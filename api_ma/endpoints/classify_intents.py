@@ -1,32 +1,22 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from schemas import ClassifyRequest
-from core.security import verify_api_key
+from core.security import verify_api_key, authenticated
 from services.functions import classify_intent_v4
+from services.executor import inference_executor, server_timing, QueueFullError
 from utils.logging_config import logger
+from utils.request_context import set_lang
 from pydantic import ValidationError
-from core.token_manager import get_current_valid_token
 
 router = APIRouter()
 
 @router.post("/classify_intent_v4")
-async def classify_v4(request: ClassifyRequest, http_request: Request, api_key: str = Depends(verify_api_key)):
+async def classify_v4(http_request: Request, response: Response, api_key: str = Depends(verify_api_key),
+                      request: ClassifyRequest = Depends(authenticated(ClassifyRequest))):
     try:
         text = request.text
         lang = request.lang
-        token = request.token
+        set_lang(lang)
         
-        client_ip = http_request.client.host
-
-        
-            
-        current_valid_token = get_current_valid_token()
-        if "open_data" not in current_valid_token:
-            logger.error(f"Token key 'open_data' not found from client ip {client_ip}")
-            raise HTTPException(status_code=403, detail="Token not found")
-
-        if current_valid_token["open_data"] != token:
-            logger.error(f"Invalid token received {token} from client IP {client_ip}")
-            raise HTTPException(status_code=403, detail="Invalid token")
 
 
 	    # if len(text) >= 500:
@@ -37,12 +27,17 @@ async def classify_v4(request: ClassifyRequest, http_request: Request, api_key:
 
         # Placeholder for your actual classify_intent_v2 function
         
-        response = classify_intent_v4(text, lang)
-        logger.info(f"POST /classify_intent_v4 HTTP/1.1 200 OK  FROM IP: {client_ip}")
+        result, timings = await inference_executor.run(classify_intent_v4, text, lang)
+        response.headers["Server-Timing"] = server_timing(timings)
         
 
-        return response
+        return result
 
+    except QueueFullError as e:
+        logger.warning(f"Inference queue full, rejecting request from IP: {http_request.client.host}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except ValidationError as e:
         logger.exception(f"Validation error: {e}")
         raise HTTPException(status_code=400, detail="Invalid request data")
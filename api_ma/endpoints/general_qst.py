@@ -1,38 +1,34 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from schemas import GeneralEqst
-from core.security import verify_api_key
+from core.security import verify_api_key, authenticated
 from pydantic import ValidationError
 from services.functions import general_qst_v1
+from services.executor import inference_executor, server_timing, QueueFullError
 from utils.logging_config import logger
-from core.token_manager import get_current_valid_token, get_cipher_suite
-from core.security import decrypt_string
 
 router = APIRouter()
 
 
 @router.post("/general_qst")
-async def general_qst(request: GeneralEqst, http_request: Request, api_key: str = Depends(verify_api_key)):
+async def general_qst(http_request: Request, response: Response, api_key: str = Depends(verify_api_key),
+                      request: GeneralEqst = Depends(authenticated(GeneralEqst, token_key=None))):
     try:
         text = request.text
-        token = request.token
-        client_ip = http_request.client.host
-        current_valid_token = get_current_valid_token()
-        cipher_suite = get_cipher_suite()
-
-        if token not in current_valid_token.values():
-             
-            logger.error(f"Unknown token: {token} from IP: {client_ip}")
-            raise HTTPException(status_code=403, detail="Could not authenticate token")
-        
-        translated_string = decrypt_string(token, cipher_suite)
+        # Corpus name of the token, resolved by the authenticated dependency
+        translated_string = http_request.state.token_corpus
 
         # Placeholder for your actual classify_intent_v2 function
-        response = general_qst_v1(text, translated_string)
-        logger.info(f"POST /general_qst HTTP/1.1 200 OK  FROM IP: {client_ip}")
+        result, timings = await inference_executor.run(general_qst_v1, text, translated_string)
+        response.headers["Server-Timing"] = server_timing(timings)
         
         
-        return {"output": response}
+        return {"output": result}
 
+    except QueueFullError as e:
+        logger.warning(f"Inference queue full, rejecting request from IP: {http_request.client.host}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except ValidationError as e:
         logger.exception(f"Validation error: {e}")
         raise HTTPException(status_code=400, detail="Invalid request data")
@@ -1,42 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from schemas import ClassifyRequest
 from pydantic import ValidationError
 from services.functions import request_data_v2
-from core.security import verify_api_key
+from services.executor import inference_executor, server_timing, QueueFullError
+from core.security import verify_api_key, authenticated
 from utils.logging_config import logger
-from core.token_manager import get_current_valid_token
+from utils.request_context import set_lang
 
 router = APIRouter()
 
 
 @router.post("/req_data_v2")
-async def req_data(request: ClassifyRequest, http_request: Request,api_key: str = Depends(verify_api_key)):
+async def req_data(http_request: Request, response: Response, api_key: str = Depends(verify_api_key),
+                   request: ClassifyRequest = Depends(authenticated(ClassifyRequest))):
     try:
         text = request.text
         lang = request.lang
-        token = request.token
-        
-        client_ip = http_request.client.host
-        current_valid_token = get_current_valid_token()
-        if "open_data" not in current_valid_token:
-            logger.error(f"Token key 'open_data' not found from client ip {client_ip}")
-            raise HTTPException(status_code=403, detail="Token not found")
-
-        if current_valid_token["open_data"] != token:
-            logger.error(f"Invalid token received {token} from client IP {client_ip}")
-            raise HTTPException(status_code=403, detail="Invalid token")
+        set_lang(lang)
 
         # if len(text) >= 500:
         #     logger.error(f"Max characters 500 exceeded from IP : {client_ip}")
         #     return {"output": "Veuillez ne pas dépasser 500 carctères"}
 
         # Placeholder for your actual classify_intent_v2 function
-        response = request_data_v2(text, lang)
-        logger.info(f"POST /req_data_v2 HTTP/1.1 200 OK  FROM IP: {client_ip}")
+        result, timings = await inference_executor.run(request_data_v2, text, lang)
+        response.headers["Server-Timing"] = server_timing(timings)
         
 
-        return {"output":response}
+        return {"output": result}
 
+    except QueueFullError as e:
+        logger.warning(f"Inference queue full, rejecting request from IP: {http_request.client.host}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except ValidationError as e:
         logger.exception(f"Validation error: {e}")
         raise HTTPException(status_code=400, detail="Invalid request data")
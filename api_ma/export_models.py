@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+from utils.logging_config import logger
+import warnings
+
+# Ignore all warnings
+warnings.filterwarnings("ignore")
+
+try:
+    load_dotenv('config.env')
+except Exception as e:
+    logger.error(f" {e}")
+    sys.exit(1)
+
+
+def export_classifier(model_path, output_path):
+    """Export the intent classifier to ONNX with its tokenizer."""
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer
+
+    model = ORTModelForSequenceClassification.from_pretrained(model_path, export=True)
+    model.save_pretrained(output_path)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+    logger.info(f"Intent classifier exported to {output_path}")
+
+
+def export_encoder(model_path, output_path):
+    """Export the sentence encoder to ONNX, keeping its pooling/normalization modules."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_path, device="cpu", backend="onnx")
+    model.save_pretrained(output_path)
+    logger.info(f"Sentence encoder exported to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the classifier and the sentence encoder to ONNX.")
+    parser.add_argument("--classifier_output", type=str, default=os.getenv("CLASSIFIER_ONNX_PATH"))
+    parser.add_argument("--encoder_output", type=str, default=os.getenv("ENCODER_ONNX_PATH"))
+    parser.add_argument("--only", type=str, choices=["classifier", "encoder"], default=None,
+                        help="Export a single model.")
+    args = parser.parse_args()
+
+    try:
+        if args.only in (None, "classifier"):
+            export_classifier(os.getenv("intent_classify_model_path"), args.classifier_output)
+        if args.only in (None, "encoder"):
+            export_encoder(os.getenv("sentence_model_path"), args.encoder_output)
+    except ImportError as e:
+        logger.error(f"ONNX export needs the optional dependencies: pip install optimum[onnxruntime] ({e})")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"An error occurred while exporting the models: {e}")
+        sys.exit(1)
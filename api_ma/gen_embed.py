@@ -1,11 +1,14 @@
-import faiss
-import numpy as np
 from sentence_transformers import SentenceTransformer
-import datasets
 import argparse
 import os
 import sys
 from utils.logging_config import logger
+from services.vector_store import INDEX_TYPES, VectorStore, read_texts, iter_texts, iter_chunks
+from services.embedding_cache import EmbeddingCache, content_hash
+from services.store_builder import StoreBuilder, source_signature
+import numpy as np
+import resource
+import time
 from dotenv import load_dotenv
 import re
 import warnings
@@ -25,7 +28,15 @@ except Exception as e:
 
 config_file = "config.env"
 
-st = SentenceTransformer(embedding_model)
+st = None
+
+
+def get_model():
+    """Load the sentence model on first use, --from-legacy conversions do not need it."""
+    global st
+    if st is None:
+        st = SentenceTransformer(embedding_model)
+    return st
 
 def check_existing_name(name_data, config_file):
     """Check if the dataset name already exists in the configuration file."""
@@ -52,45 +63,124 @@ def validate_path(path_data):
         raise FileNotFoundError(f"The provided path '{path_data}' is not a valid file.")
         
 
-def update_config(name_data, path_data, faiss_path):
-    """Update or add entries in the configuration file with new dataset path and FAISS index."""
+def update_config(name_data, entries):
+    """Update or add the {name_data}_{KEY}=value entries in the configuration file."""
     updated_lines = []
-    dataset_path_updated = False
-    faiss_index_updated = False
+    remaining = dict(entries)
 
     if os.path.exists(config_file):
         with open(config_file, "r") as f:
             for line in f:
-                if line.startswith(f"{name_data}_DATASET_PATH="):
-                    updated_lines.append(f"{name_data}_DATASET_PATH={path_data}\n")
-                    dataset_path_updated = True
-                elif line.startswith(f"{name_data}_FAISS_INDEX="):
-                    updated_lines.append(f"{name_data}_FAISS_INDEX={faiss_path}\n")
-                    faiss_index_updated = True
+                key = line.split("=", 1)[0]
+                suffix = key[len(name_data) + 1:] if key.startswith(f"{name_data}_") else None
+                if suffix in remaining:
+                    updated_lines.append(f"{key}={remaining.pop(suffix)}\n")
                 else:
                     updated_lines.append(line)
 
-    # If the dataset path was not updated, add it
-    if not dataset_path_updated:
-        updated_lines.append(f"{name_data}_DATASET_PATH={path_data}\n")
-    
-    # If the FAISS index was not updated, add it
-    if not faiss_index_updated:
-        updated_lines.append(f"{name_data}_FAISS_INDEX={faiss_path}\n")
+    # Add the entries that were not in the file yet
+    if updated_lines and not updated_lines[-1].endswith("\n"):
+        updated_lines[-1] += "\n"
+    for suffix, value in remaining.items():
+        updated_lines.append(f"{name_data}_{suffix}={value}\n")
 
     # Write the updated lines back to the config file
     with open(config_file, "w") as f:
         f.writelines(updated_lines)
 
-def generate_embeddings(name_data, path_data):
+def embed_texts(texts, batch_size=64, workers=1):
+    """Encode texts, over a pool of worker processes when workers > 1."""
+    model = get_model()
+    if workers > 1 and len(texts) > batch_size:
+        pool = model.start_multi_process_pool(["cpu"] * workers)
+        try:
+            return model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+def embed_with_cache(texts, cache, batch_size=64, workers=1):
+    """Vectors of texts, encoding only the ones whose content hash is not in the cache yet."""
+    hashes = [content_hash(text) for text in texts]
+    missing = {key: text for key, text in zip(hashes, texts) if key not in cache}
+    if missing:
+        cache.update(zip(missing.keys(), embed_texts(list(missing.values()), batch_size, workers)))
+    return hashes, np.stack([cache.get(key) for key in hashes]), len(missing)
+
+
+def chunk_rows_for(max_memory_mb, batch_size=64, workers=1, dim=384, avg_text_bytes=512):
+    """Rows per chunk so that a chunk and the encoding activations stay within the budget, model weights excluded."""
+    # ~128 tokens x hidden size x 4 bytes per row of a batch, a few layers alive at once
+    activations = workers * batch_size * 128 * dim * 4 * 4
+    # The text as str and UTF-8, the output vector and its normalized copy in the index
+    per_row = avg_text_bytes * 3 + dim * 4 * 3
+    return max(batch_size * workers, int((max_memory_mb * 1024 * 1024 - activations) // per_row))
+
+
+def stream_embeddings(name_data, path_data, index_type, batch_size=64, workers=1, chunk_rows=None,
+                      max_memory_mb=1024, restart=False, expected_rows=None):
+    """Build the store of a large dataset chunk by chunk, resuming from the last checkpoint if any.
+
+    Memory is bounded by one chunk plus the index being built, whatever the
+    size of the dataset. Checkpoints are written after every chunk. IVF
+    lists are sized for expected_rows, counted with a first pass over the
+    file (no encoding) when it is not given.
+    """
+    store_prefix = f"./embeddings/{name_data}"
+    chunk_rows = chunk_rows or chunk_rows_for(max_memory_mb, batch_size, workers)
+    if index_type == "ivf" and not expected_rows:
+        expected_rows = sum(1 for _ in iter_texts(path_data))
+        logger.info(f"'{name_data}' has {expected_rows} rows")
+    builder = StoreBuilder(store_prefix, index_type, source_signature(path_data), expected_rows)
+    if restart and os.path.exists(builder.checkpoint_path):
+        os.remove(builder.checkpoint_path)
+    done = builder.resume()
+
+    model = get_model()
+    pool = model.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+    start, encoded = time.perf_counter(), 0
+    try:
+        texts = iter_texts(path_data)
+        for _ in range(done):
+            next(texts)
+        for chunk in iter_chunks(texts, chunk_rows):
+            chunk_start = time.perf_counter()
+            if pool is not None:
+                embeddings = model.encode_multi_process(chunk, pool, batch_size=batch_size)
+            else:
+                embeddings = model.encode(chunk, batch_size=batch_size, convert_to_numpy=True)
+            builder.add(embeddings, chunk)
+            builder.checkpoint()
+            encoded += len(chunk)
+            print(f"{builder.rows} rows | chunk {len(chunk) / (time.perf_counter() - chunk_start):.0f} sentences/s | "
+                  f"overall {encoded / (time.perf_counter() - start):.0f} sentences/s")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+    builder.finish()
+    # The content-hash cache no longer matches, the next incremental run seeds it from the new store
+    if os.path.exists(EmbeddingCache.path(store_prefix)):
+        os.remove(EmbeddingCache.path(store_prefix))
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(f"Streamed build of '{name_data}': {builder.rows} rows, {encoded} encoded in this run, "
+                f"peak RSS {peak_mb:.0f} MB")
+    return builder.rows
+
+
+def generate_embeddings(name_data, path_data, index_type=None, from_legacy=None, incremental=False,
+                        batch_size=64, workers=1, stream=False, chunk_rows=None, max_memory_mb=1024, restart=False,
+                        expected_rows=None):
 
     try:
             
         validate_path(path_data)
+        index_type = index_type or os.getenv(f"{name_data}_INDEX_TYPE") or os.getenv("VECTOR_INDEX_TYPE", "flat")
     
-        # Check if the name_data already exists
+        # Check if the name_data already exists, updating it is the point of an incremental run
         while True:
-            if check_existing_name(name_data, config_file):
+            if not incremental and check_existing_name(name_data, config_file):
                 if not prompt_user_for_override(name_data):
                     name_data = input("Please provide another name or type 'exit' to quit: ").strip()
                     if name_data.lower() == 'exit':
@@ -98,25 +188,36 @@ def generate_embeddings(name_data, path_data):
                         return
                     continue  # Recheck the new name
                 
-        # Load the dataset and generate embeddings
-            df = datasets.load_dataset("json", data_files=[path_data], split="train")
-            embeddings = st.encode(df["text"], convert_to_numpy=True)
-            
-            # Create FAISS index
-            dimension = embeddings.shape[1]
-            index = faiss.IndexFlatL2(dimension)
-            
-            # Add the embeddings to the index
-            index.add(embeddings)
-            
-            # Write the embeddings index to disk
-            faiss_path = f"./embeddings/{name_data}.faiss" 
+            store_prefix = f"./embeddings/{name_data}"
+            if stream:
+                rows = stream_embeddings(name_data, path_data, index_type, batch_size, workers,
+                                         chunk_rows, max_memory_mb, restart, expected_rows)
+                update_config(name_data, {"DATASET_PATH": path_data, "VECTOR_STORE": store_prefix, "INDEX_TYPE": index_type})
+                logger.info(f"Embeddings of the dataset '{name_data}' have been generated successfully ({index_type} index, {rows} rows).")
+                break
+            texts = read_texts(path_data)
+
+        # Load the dataset and generate embeddings, or reuse the vectors of a legacy .faiss index
+            if from_legacy:
+                store = VectorStore.from_legacy(path_data, from_legacy, index_type, name_data)
+                cache = EmbeddingCache(dict(zip((content_hash(text) for text in texts), store.vectors())))
+                hashes = list(cache.vectors)
+            else:
+                cache = EmbeddingCache.load(store_prefix) if incremental else EmbeddingCache()
+                known = len(cache)
+                hashes, embeddings, encoded = embed_with_cache(texts, cache, batch_size, workers)
+                removed = len(set(cache.vectors) - set(hashes)) if incremental else 0
+                logger.info(f"'{name_data}': {encoded} rows encoded, {len(texts) - encoded} reused "
+                            f"from {known} cached, {removed} removed")
+                store = VectorStore.build(embeddings, texts, index_type, name_data)
             
-            faiss.write_index(index, faiss_path)
+            # Write the vector store and its embedding cache to disk, each file is swapped atomically
+            store.save(store_prefix)
+            cache.save(store_prefix, hashes)
             
-            # Append the dataset path to the config file
-            update_config(name_data, path_data, faiss_path)
-            logger.info(f"Embeddings of the dataset '{name_data}' have been generated successfully.")
+            # Append the dataset path and the vector store to the config file
+            update_config(name_data, {"DATASET_PATH": path_data, "VECTOR_STORE": store_prefix, "INDEX_TYPE": index_type})
+            logger.info(f"Embeddings of the dataset '{name_data}' have been generated successfully ({index_type} index, {len(store)} rows).")
             break
 
     except Exception as e:
@@ -128,6 +229,27 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate embeddings of a dataset.")
     parser.add_argument("name_data", type=str, help="The name of the dataset.")
     parser.add_argument("path_data", type=str, help="The path of the dataset.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=None,
+                        help="flat (exact), ivf or hnsw (approximate, for large corpora). "
+                             "Defaults to {NAME}_INDEX_TYPE, then VECTOR_INDEX_TYPE.")
+    parser.add_argument("--from-legacy", type=str, default=None, metavar="FAISS_INDEX",
+                        help="Convert an existing .faiss index of the dataset instead of encoding it again.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only encode the rows that are new or changed since the last build, drop deleted ones.")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBED_BATCH_SIZE", "64")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EMBED_WORKERS", "0")) or os.cpu_count(),
+                        help="Encoding processes, defaults to EMBED_WORKERS or the number of cores.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read and encode the dataset in chunks with checkpoints, for corpora that do not fit in memory. "
+                             "An interrupted build resumes from its last checkpoint.")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per chunk, derived from --max-memory-mb by default.")
+    parser.add_argument("--max-memory-mb", type=int, default=int(os.getenv("EMBED_MAX_MEMORY_MB", "1024")),
+                        help="Memory budget of one chunk and its encoding in --stream mode, on top of the model and the index.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous --stream build.")
+    parser.add_argument("--expected-rows", type=int, default=None,
+                        help="Estimated rows of the dataset, sizes the IVF lists of a --stream build without counting the rows first.")
     args = parser.parse_args()
     
-    generate_embeddings(args.name_data, args.path_data)
\ No newline at end of file
+    generate_embeddings(args.name_data, args.path_data, args.index_type, args.from_legacy,
+                        args.incremental, args.batch_size, args.workers,
+                        args.stream, args.chunk_rows, args.max_memory_mb, args.restart, args.expected_rows)
\ No newline at end of file
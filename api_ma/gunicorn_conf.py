@@ -0,0 +1,32 @@
+# Gunicorn settings for SERVING_MODE=preload (see run_api.sh).
+# The app, and therefore every model and index, is imported once in the
+# master process; uvicorn workers are then forked and share those pages
+# copy-on-write instead of each loading their own copy.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+# Tokenizers' own thread pool does not survive a fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def when_ready(server):
+    if os.getenv("MODEL_LOADING", "eager").lower() == "eager":
+        from services.functions import models
+        models.load_all()
+    # Move everything allocated while loading the models to the permanent
+    # generation so the cyclic GC of the workers never writes to those pages.
+    gc.freeze()
+    server.log.info(f"Models preloaded, {len(gc.get_objects())} objects shared with the workers")
+
+
+def child_exit(server, worker):
+    # Forget the live gauges of the dead worker, its histograms stay in the totals of /metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,35 +1,72 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Response
 from fastapi.responses import JSONResponse
-from core.config import load_configuration, initialize_tokens, start_file_watcher
+from core.config import load_configuration, initialize_tokens, config_watcher
 from fastapi.middleware.cors import CORSMiddleware
 from endpoints.general_qst import router as general_qst_router
 from endpoints.request_data import router as request_data_router
 from endpoints.general_v1 import router as general_v1_router
 from endpoints.classify_intents import router as classify_intents_router
-import threading
+from endpoints.admin import router as admin_router
+from endpoints.batch import router as batch_router
+from services.executor import inference_executor
+from services.functions import general_corpora, models, indexes, answer_cache, translation
+from services.ckan_client import ckan_client
 import asyncio
+import signal
 from contextlib import asynccontextmanager
-import psutil
-from utils.logging_config import logger
+import os
+import time
+import uuid
+from utils.logging_config import logger, stop_logging
+from utils.metrics import REQUEST_SECONDS, collector, render_metrics
+from utils.request_context import request_labels, start_request
 
 app = FastAPI()
 
 # Middleware CORS
 
 
+async def refresh_indexes(names):
+    # config.env may point the corpora at other files
+    if "config.env" in names:
+        await asyncio.to_thread(indexes.refresh_all)
+
+
+config_watcher.add_listener(refresh_indexes)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await load_configuration()
     await initialize_tokens()
-    
-    watcher_thread = threading.Thread(target=lambda: asyncio.run(start_file_watcher()), daemon=True)
-    watcher_thread.start()
 
-    
+    # In preload mode the gunicorn master has already loaded everything before forking
+    if os.getenv("MODEL_LOADING", "eager").lower() == "eager":
+        models.start_loading()
+
+    if os.getenv("PRELOAD_GENERAL_CORPORA", "false").lower() == "true":
+        await asyncio.to_thread(general_corpora.preload)
+
+    # Each worker watches the index files itself, the observer thread must not exist before the fork
+    indexes.start_watching([path.strip() for path in os.getenv("INDEX_WATCH_PATHS", "./embeddings,./datasets").split(",") if path.strip()])
+
+    # tokens.env and config.env are reloaded on this loop when they change, or on SIGHUP
+    loop = asyncio.get_running_loop()
+    config_watcher.start(loop)
+    try:
+        loop.add_signal_handler(signal.SIGHUP, config_watcher.trigger)
+    except (NotImplementedError, AttributeError, RuntimeError) as e:
+        logger.warning(f"SIGHUP configuration reload is not available: {e}")
+
     yield  # This yield indicates that the application is running.
 
     # Cleanup actions can be placed here if necessary
     logger.info("Application is cleaning up resources.")
+    inference_executor.shutdown()
+    indexes.stop_watching()
+    config_watcher.stop()
+    ckan_client.close()
+    stop_logging()
 
 # Set the lifespan for the FastAPI app
 app = FastAPI(lifespan=lifespan)
@@ -51,27 +88,99 @@ async def custom_http_exception_handler(request: Request, exc: HTTPException):
         return JSONResponse(
             status_code=exc.status_code,
             content={"message": exc.detail},
+            headers=getattr(exc, "headers", None),
         )
     
-@app.middleware("http")
-async def log_memory_usage(request: Request, call_next):
-    # Log memory usage before the API call
-    mem = psutil.virtual_memory()
-    logger.info(f"Memory Usage: {mem.percent}% used, {mem.available / (1024 * 1024)} MB available")
-
-    response = await call_next(request)
+# Successful requests faster than this are subject to LOG_SUCCESS_SAMPLE_RATE, slower ones are always logged
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
 
-    # Log memory usage after the API call
-    mem = psutil.virtual_memory()
-    logger.info(f"Memory Usage after request: {mem.percent}% used, {mem.available / (1024 * 1024)} MB available")
 
-    return response
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Stage timings and log records of the request are labelled with its path, language and ID
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = start_request(request.url.path, request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        labels = request_labels.get()
+        route = request.scope.get("route")
+        # Unmatched paths share one label to keep the number of series bounded
+        endpoint = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(endpoint, labels["lang"], str(status)).observe(duration)
+        logger.info(f"{request.method} {request.url.path} {status} in {duration * 1000:.1f} ms", extra={
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "client_ip": request.client.host if request.client else None,
+            "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in labels["timings"].items()},
+            **labels["fields"],
+            "sample": status < 400 and duration * 1000 < LOG_SLOW_REQUEST_MS,
+        })
+        request_labels.reset(token)
+
+
+def cache_hits(stats):
+    return {"hits": stats["hits"], "misses": stats["misses"]}
+
+
+def speller_caches():
+    speller = models.peek("speller")
+    if speller is None:
+        return None
+    stats = speller.stats()
+    return {"spell_words": cache_hits(stats["words"]), "spell_texts": cache_hits(stats["texts"])}
+
+
+def answer_caches():
+    return {
+        f"answer_{lang}": {"hits": stats["exact_hits"] + stats["semantic_hits"], "misses": stats["misses"]}
+        for lang, stats in answer_cache.stats()["partitions"].items()
+    }
+
+
+def ckan_caches():
+    if ckan_client.cache is None:
+        return None
+    lookups = ckan_client.cache.stats()["lookups"]
+    return {"ckan": {"hits": lookups.get("fresh", 0) + lookups.get("stale", 0), "misses": lookups.get("miss", 0)}}
+
+
+collector.add_gauge("chatbot_inference_queue_depth", "Jobs waiting for an inference worker",
+                    lambda: inference_executor.queue_depth)
+collector.add_gauge("chatbot_inference_in_flight", "Jobs running on the inference workers",
+                    lambda: inference_executor.in_flight)
+collector.add_cache("answer", answer_caches)
+collector.add_cache("spelling", speller_caches)
+collector.add_cache("translation", lambda: {"translation": cache_hits(translation.stats()["cache"])})
+collector.add_cache("ckan", ckan_caches)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition: stage and request histograms, process RSS/CPU, queue depth and cache hit rates."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/health")
 async def health_check():
     return {"status": "OK", "message": "API is running"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    ready = models.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "components": models.status()},
+    )
+
+
 @app.get("/")
 async def root():
     return {"message": "Bienvenue #ADD "}
@@ -93,6 +202,8 @@ app.include_router(general_qst_router, prefix="/api")
 app.include_router(request_data_router, prefix="/api")
 app.include_router(general_v1_router, prefix="/api")
 app.include_router(classify_intents_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+app.include_router(batch_router, prefix="/api")
 
 
 if __name__ == '__main__':
@@ -1 +1,21 @@
-uvicorn main:app --host 0.0.0.0 --port 5000 --workers 2
+# SERVING_MODE=preload: a gunicorn master loads the models once and forks the workers (copy-on-write).
+# SERVING_MODE=uvicorn: every worker imports the app and loads its own copy of the models.
+# Values already set in the environment take precedence over config.env.
+config_value() { grep -E "^$1=" config.env 2>/dev/null | tail -1 | cut -d= -f2-; }
+
+export SERVING_MODE="${SERVING_MODE:-$(config_value SERVING_MODE)}"
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-$(config_value WEB_CONCURRENCY)}"
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
+
+# /metrics aggregates the workers through the files of PROMETHEUS_MULTIPROC_DIR; it must be set before
+# Python starts and emptied of the files of the previous run, whose worker pids may be reused.
+# It is deliberately not read from config.env, which the app loads after prometheus_client may be imported.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/chatbot_prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "$SERVING_MODE" = "uvicorn" ]; then
+    exec uvicorn main:app --host 0.0.0.0 --port "${PORT:-5000}" --workers "$WEB_CONCURRENCY"
+else
+    exec gunicorn main:app -c gunicorn_conf.py
+fi
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 
@@ -10,3 +11,16 @@ class GeneralEqst(BaseModel):
     text: str
     token: str
 
+class BatchClassifyRequest(BaseModel):
+    texts: List[str]
+    lang: str = 'fr'
+    token: str
+    stream: bool = False
+
+class BatchSearchRequest(BaseModel):
+    texts: List[str]
+    lang: str = 'fr'
+    index: str = 'answers'
+    k: int = 1
+    token: str
+    stream: bool = False
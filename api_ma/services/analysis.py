@@ -0,0 +1,136 @@
+import threading
+from utils.metrics import stage
+
+# Parts of speech dropped from a French query before the tag lookup
+KEYWORD_EXCLUDED_POS = ("VERB", "DET", "ADP", "PRON")
+
+
+class AnalyzedQuery:
+    """Request-scoped analysis of a user query.
+
+    Each stage (translation, spaCy parse, spelling correction, keyword
+    extraction, sentence embeddings) runs at most once, on first access, and
+    is then shared by intent classification, general_v1, request_data_v2 and
+    search.
+    """
+
+    def __init__(self, text, lang, nlp, speller, translate, encoder):
+        self.text = text
+        self.lang = lang
+        self._nlp = nlp
+        self._speller = speller
+        self._translate = translate
+        self._encoder = encoder
+        self._embeddings = {}
+        self._embeddings_lock = threading.Lock()
+        # Nearest examples already retrieved for this query, and the speculative retrieval job if any
+        self.retrievals = {}
+        self.speculation = None
+        self._translation = None
+        self._doc = None
+        self._corrected = None
+        self._keywords = None
+
+    @property
+    def translation(self):
+        """French translation of an Arabic query, or the text itself for French."""
+        if self._translation is None:
+            if self.lang == "fr":
+                self._translation = self.text
+            else:
+                with stage("translation"):
+                    self._translation = self._translate(self.text)
+        return self._translation
+
+    @property
+    def doc(self):
+        """spaCy Doc of the French text (the translation for Arabic queries)."""
+        if self._doc is None:
+            translation = self.translation
+            with stage("spacy"):
+                self._doc = self._nlp(translation)
+        return self._doc
+
+    @property
+    def corrected(self):
+        """Spell-corrected French text, used for intent classification."""
+        if self._corrected is None:
+            translation, doc = self.translation, self.doc
+            with stage("spell"):
+                self._corrected = self._speller.correct_text(translation, doc)
+        return self._corrected
+
+    @property
+    def keywords(self):
+        """Corrected French text without verbs, determiners, prepositions and pronouns."""
+        if self._keywords is None:
+            kept = [token.text for token in self.doc if token.pos_ not in KEYWORD_EXCLUDED_POS]
+            with stage("spell"):
+                self._keywords = " ".join(self._speller.correct_tokens(kept))
+        return self._keywords
+
+    @property
+    def search_text(self):
+        """Text matched against the answer corpus of the query language."""
+        return self.corrected if self.lang == "fr" else self.text
+
+    @property
+    def tag_text(self):
+        """Text matched against the tag corpus."""
+        return self.keywords if self.lang == "fr" else self.text
+
+    def embedding_for(self, text):
+        """Sentence embedding of text, encoded once per request."""
+        with self._embeddings_lock:
+            if text not in self._embeddings:
+                with stage("encode"):
+                    self._embeddings[text] = self._encoder(text)
+            return self._embeddings[text]
+
+    def prefetch_embeddings(self, texts):
+        """Encode every missing text in a single encoder batch."""
+        with self._embeddings_lock:
+            missing = [text for text in dict.fromkeys(texts) if text not in self._embeddings]
+            with stage("encode"):
+                vectors = self._encoder.map(missing)
+            for text, vector in zip(missing, vectors):
+                self._embeddings[text] = vector
+
+    @property
+    def embedding(self):
+        """Sentence embedding of search_text."""
+        return self.embedding_for(self.search_text)
+
+
+def analyze_batch(texts, lang, nlp, speller, translate, encoder, parse=True):
+    """AnalyzedQuery objects for a list of texts, translated and parsed in batches.
+
+    With parse=False nothing runs up front: callers that never read
+    corrected, keywords or doc (Arabic search, the embedding intent router)
+    then never pay for the translator or spaCy, which may even be disabled.
+    """
+    queries = [AnalyzedQuery(text, lang, nlp, speller, translate, encoder) for text in texts]
+    if not parse:
+        return queries
+    if lang != "fr":
+        with stage("translation"):
+            translations = translate.map(texts)
+        for query, translated in zip(queries, translations):
+            query._translation = translated
+    with stage("spacy"):
+        docs = list(nlp.pipe([query.translation for query in queries]))
+    for query, doc in zip(queries, docs):
+        query._doc = doc
+    return queries
+
+
+def encode_batch(queries, texts, encode):
+    """Embeddings of texts[i] for queries[i], encoding the missing distinct texts in one call."""
+    missing = list(dict.fromkeys(text for query, text in zip(queries, texts) if text not in query._embeddings))
+    with stage("encode"):
+        vectors = dict(zip(missing, encode(missing))) if missing else {}
+    for query, text in zip(queries, texts):
+        if text in vectors:
+            with query._embeddings_lock:
+                query._embeddings.setdefault(text, vectors[text])
+    return [query.embedding_for(text) for query, text in zip(queries, texts)]
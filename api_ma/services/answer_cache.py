@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import faiss
+import numpy as np
+from services.translation import normalize_arabic
+from services.vector_store import normalize
+from utils.cache import LRUCache
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(text, lang="fr"):
+    """Exact-tier key: case, punctuation, diacritics and spacing do not change the answer."""
+    if lang == "ar":
+        text = normalize_arabic(text)
+    return " ".join(PUNCTUATION.sub(" ", text.casefold()).split())
+
+
+class SemanticPartition:
+    """Recent query embeddings of one language in a flat inner-product index, evicted oldest first."""
+
+    def __init__(self, maxsize=2000):
+        self.maxsize = maxsize
+        self.index = None
+        self._entries = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, embedding):
+        """Return (similarity, entry) of the nearest cached query, or (None, None)."""
+        if not self._entries:
+            return None, None
+        scores, ids = self.index.search(normalize(embedding), 1)
+        if ids[0][0] < 0:
+            return None, None
+        return float(scores[0][0]), self._entries.get(int(ids[0][0]))
+
+    def add(self, embedding, entry):
+        if self.maxsize <= 0:
+            return
+        embedding = normalize(embedding)
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(embedding, np.array([entry_id], dtype="int64"))
+        self._entries[entry_id] = entry
+        if len(self._entries) > self.maxsize:
+            evicted = [self._entries.popitem(last=False)[0] for _ in range(len(self._entries) - self.maxsize)]
+            self.index.remove_ids(np.array(evicted, dtype="int64"))
+
+    def clear(self):
+        self.index = None
+        self._entries.clear()
+
+
+class AnswerCache:
+    """Response cache in front of classify_intent_v4, partitioned by language.
+
+    The exact tier is keyed on the normalized query text. The semantic tier
+    returns the answer of a recent query whose embedding has a cosine
+    similarity of at least threshold; it only holds general_v1 answers,
+    since data requests hinge on exact terms (a year, a region) that a close
+    paraphrase may change. Entries expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize=10000, semantic_maxsize=2000, threshold=0.95, ttl=3600, semantic_functions=("general_v1",)):
+        self.maxsize = maxsize
+        self.semantic_maxsize = semantic_maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.semantic_functions = set(semantic_functions)
+        self._exact = {}
+        self._semantic = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _partition(self, lang):
+        with self._lock:
+            if lang not in self._locks:
+                self._exact[lang] = LRUCache(self.maxsize)
+                self._semantic[lang] = SemanticPartition(self.semantic_maxsize)
+                self._locks[lang] = threading.Lock()
+                self._counters[lang] = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+            return self._exact[lang], self._semantic[lang], self._locks[lang]
+
+    def _fresh(self, entry):
+        return entry is not None and time.monotonic() - entry["stored_at"] < self.ttl
+
+    def _count(self, lang, counter):
+        with self._lock:
+            self._counters[lang][counter] += 1
+
+    def get(self, text, lang, embed=None):
+        """Cached response for text, trying the exact tier then, if embed is given, the semantic tier.
+
+        embed is a callable returning the query embedding, only called when
+        the semantic tier is searched.
+        """
+        if self.maxsize <= 0:
+            return None
+        exact, semantic, lock = self._partition(lang)
+        entry = exact.get(normalize_query(text, lang))
+        if self._fresh(entry):
+            self._count(lang, "exact_hits")
+            return entry["response"]
+        if embed is not None and self.semantic_maxsize > 0 and len(semantic):
+            embedding = embed()
+            with lock:
+                score, entry = semantic.search(embedding)
+            if score is not None and score >= self.threshold and self._fresh(entry):
+                self._count(lang, "semantic_hits")
+                return entry["response"]
+        self._count(lang, "misses")
+        return None
+
+    def put(self, text, lang, response, embed=None, function=None):
+        if self.maxsize <= 0:
+            return
+        exact, semantic, lock = self._partition(lang)
+        entry = {"response": response, "stored_at": time.monotonic()}
+        exact.put(normalize_query(text, lang), entry)
+        if embed is not None and function in self.semantic_functions and self.semantic_maxsize > 0:
+            embedding = embed()
+            with lock:
+                semantic.add(embedding, entry)
+
+    def invalidate(self, lang=None):
+        for name in ([lang] if lang else list(self._locks)):
+            if name not in self._locks:
+                continue
+            exact, semantic, lock = self._partition(name)
+            with lock:
+                exact.clear()
+                semantic.clear()
+            self._count(name, "invalidations")
+
+    def stats(self):
+        stats = {}
+        for lang in list(self._locks):
+            exact, semantic, _ = self._partition(lang)
+            counters = dict(self._counters[lang])
+            lookups = counters["exact_hits"] + counters["semantic_hits"] + counters["misses"]
+            hits = counters["exact_hits"] + counters["semantic_hits"]
+            stats[lang] = {
+                **counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "exact_size": len(exact),
+                "semantic_size": len(semantic),
+            }
+        return {"threshold": self.threshold, "ttl": self.ttl, "partitions": stats}
@@ -0,0 +1,47 @@
+import os
+from transformers import AutoTokenizer, pipeline
+from sentence_transformers import SentenceTransformer
+from utils.logging_config import logger
+
+BACKENDS = ("torch", "onnx", "int8")
+
+
+def backend_for(component):
+    """Backend of a component: {COMPONENT}_BACKEND, falling back to INFERENCE_BACKEND."""
+    backend = os.getenv(f"{component.upper()}_BACKEND") or os.getenv("INFERENCE_BACKEND", "torch")
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {component}, expected one of {BACKENDS}")
+    return backend
+
+
+def quantize_int8(module):
+    """Dynamic int8 quantization of the Linear layers, weights only, for CPU inference."""
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_classifier(model_path, backend="torch", onnx_path=None):
+    if backend == "onnx":
+        # Optional dependency, only needed for this backend
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        model = ORTModelForSequenceClassification.from_pretrained(onnx_path)
+        tokenizer = AutoTokenizer.from_pretrained(onnx_path)
+        classifier = pipeline("text-classification", model=model, tokenizer=tokenizer)
+    else:
+        classifier = pipeline("text-classification", model_path)
+        if backend == "int8":
+            classifier.model = quantize_int8(classifier.model)
+    logger.info(f"Intent classifier running on the '{backend}' backend")
+    return classifier
+
+
+def load_sentence_encoder(model_path, backend="torch", onnx_path=None):
+    if backend == "onnx":
+        model = SentenceTransformer(onnx_path, device="cpu", backend="onnx")
+    else:
+        model = SentenceTransformer(model_path, device="cpu")
+        if backend == "int8":
+            model[0].auto_model = quantize_int8(model[0].auto_model)
+    logger.info(f"Sentence encoder running on the '{backend}' backend")
+    return model
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from utils.logging_config import logger
+
+
+class MicroBatcher:
+    """Groups concurrent single-item calls into one call of a batch function.
+
+    Callers block in __call__ until their own result is ready. The background
+    thread waits at most max_wait_ms after the first item of a batch, or until
+    max_batch_size items are queued, then runs batch_fn once on the whole list.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._histogram = Counter()
+        self._items = 0
+
+    def _ensure_worker(self):
+        # Started on first use so that no thread exists before a fork.
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def __call__(self, item):
+        if self.max_batch_size <= 1:
+            self._record(1)
+            return self.batch_fn([item])[0]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def map(self, items):
+        """Submit several items at once so they land in the same batch, results in input order."""
+        if not items:
+            return []
+        if self.max_batch_size <= 1:
+            self._record(len(items))
+            return list(self.batch_fn(list(items)))
+        self._ensure_worker()
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window elapsed: still take whatever is already queued.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                outputs = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                logger.error(f"An error occurred in {self.name} batch of {len(batch)}: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self._record(len(batch))
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+    def _record(self, size):
+        with self._lock:
+            self._histogram[size] += 1
+            self._items += size
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._histogram.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "items": self._items,
+                "mean_batch_size": self._items / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._histogram.items())),
+            }
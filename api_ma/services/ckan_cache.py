@@ -0,0 +1,167 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from utils.cache import LRUCache
+from utils.logging_config import logger
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+
+class MemoryBackend:
+    """Per-process store, bounded in number of entries."""
+
+    def __init__(self, max_entries=10000):
+        self._entries = LRUCache(max_entries)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, value, stored_at):
+        self._entries.put(key, (value, stored_at))
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SqliteBackend:
+    """Store on local disk shared by every uvicorn worker of the host.
+
+    The table is pruned after a put, at most every prune_interval seconds:
+    rows older than max_age (no longer servable, even stale) are deleted,
+    then the oldest rows beyond max_entries.
+    """
+
+    def __init__(self, path, max_entries=10000, max_age=None, prune_interval=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._local = threading.local()
+        # Connections are opened per thread on first use, never shared across a fork.
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ckan_cache ("
+                    "tag TEXT NOT NULL, lang TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL, "
+                    "PRIMARY KEY (tag, lang))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ckan_cache_stored_at ON ckan_cache (stored_at)")
+        finally:
+            conn.close()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            # WAL lets readers in other workers proceed while one worker writes.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM ckan_cache WHERE tag = ? AND lang = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        titles, links, res_url, count = json.loads(row[0])
+        return (titles, links, res_url, count), row[1]
+
+    def put(self, key, value, stored_at):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ckan_cache (tag, lang, value, stored_at) VALUES (?, ?, ?, ?)",
+                (key[0], key[1], json.dumps(value, ensure_ascii=False), stored_at),
+            )
+        if stored_at >= self._next_prune:
+            self._next_prune = stored_at + self.prune_interval
+            self.prune(stored_at)
+
+    def prune(self, now=None):
+        """Delete the expired rows, then the oldest ones beyond max_entries."""
+        now = now if now is not None else time.time()
+        with self._connection() as conn:
+            if self.max_age is not None:
+                conn.execute("DELETE FROM ckan_cache WHERE stored_at < ?", (now - self.max_age,))
+            conn.execute(
+                "DELETE FROM ckan_cache WHERE rowid IN "
+                "(SELECT rowid FROM ckan_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM ckan_cache")
+
+
+class CkanCache:
+    """TTL cache of package_search results keyed by (tag, lang).
+
+    Entries younger than ttl are fresh. Up to stale_ttl seconds after that
+    they are still served, but the caller should refresh them in the
+    background. Tags with no dataset (count 0) expire after negative_ttl.
+    """
+
+    def __init__(self, backend, ttl=86400, stale_ttl=604800, negative_ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.lookups = Counter()
+
+    def get(self, tag, lang):
+        """Return (value, state) with state one of FRESH, STALE or MISS."""
+        try:
+            entry = self.backend.get((tag, lang))
+        except Exception as e:
+            logger.error(f"An error occurred while reading the CKAN cache: {e}")
+            entry = None
+        state = MISS
+        value = None
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            ttl = self.ttl if value[-1] else self.negative_ttl
+            if age < ttl:
+                state = FRESH
+            elif age < ttl + self.stale_ttl:
+                state = STALE
+        self.lookups[state] += 1
+        return (value if state != MISS else None), state
+
+    def put(self, tag, lang, value):
+        try:
+            self.backend.put((tag, lang), value, time.time())
+        except Exception as e:
+            logger.error(f"An error occurred while writing the CKAN cache: {e}")
+
+    def stats(self):
+        total = sum(self.lookups.values())
+        return {
+            "lookups": dict(self.lookups),
+            "hit_rate": (self.lookups[FRESH] + self.lookups[STALE]) / total if total else 0.0,
+        }
+
+
+def build_ckan_cache():
+    """Create the cache configured in config.env, or None when CKAN_CACHE_BACKEND=none."""
+    backend_name = os.getenv("CKAN_CACHE_BACKEND", "memory").lower()
+    if backend_name == "none":
+        return None
+    max_entries = int(os.getenv("CKAN_CACHE_MAX_ENTRIES", "10000"))
+    ttl = float(os.getenv("CKAN_CACHE_TTL", "86400"))
+    stale_ttl = float(os.getenv("CKAN_CACHE_STALE_TTL", "604800"))
+    negative_ttl = float(os.getenv("CKAN_CACHE_NEGATIVE_TTL", "3600"))
+    if backend_name == "sqlite":
+        # No entry is served after ttl + stale_ttl, negative ones even earlier
+        backend = SqliteBackend(os.getenv("CKAN_CACHE_PATH", "./ckan_cache.sqlite"), max_entries,
+                                max_age=max(ttl, negative_ttl) + stale_ttl)
+    else:
+        backend = MemoryBackend(max_entries)
+    return CkanCache(backend, ttl=ttl, stale_ttl=stale_ttl, negative_ttl=negative_ttl)
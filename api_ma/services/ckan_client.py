@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from services.ckan_cache import build_ckan_cache, FRESH, STALE
+from utils.logging_config import logger
+
+try:
+    load_dotenv("config.env")
+except Exception as e:
+    logger.error(f"An error occurred while loading the config.env file: {e}")
+    raise
+
+
+class CkanClient:
+    """Async client for the data.gov.ma CKAN API with a shared connection pool.
+
+    The httpx client lives on a private event loop running in a background
+    thread, so the synchronous pipeline (running in the inference executor)
+    can fan out several package_search calls concurrently and wait for them.
+    """
+
+    def __init__(self, base_url, timeout=5.0, max_connections=20, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = cache
+        self._refreshing = set()
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # Started on first use so that no thread exists before a fork.
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ckan-client", daemon=True).start()
+                self._client = asyncio.run_coroutine_threadsafe(self._create_client(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _create_client(self):
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+        )
+
+    def dataset_url(self, lang, dataset_id):
+        return f"{self.base_url}/{lang}/dataset/{dataset_id}"
+
+    def search_url(self, lang, mot):
+        return f"{self.base_url}/{lang}/dataset?q={mot}"
+
+    async def _fetch(self, mot, lang):
+        titles, links = [], []
+        response = await self._client.get(
+            f"{self.base_url}/api/3/action/package_search",
+            params={"q": mot, "rows": 1},
+        )
+        response.raise_for_status()
+        result = response.json()["result"]
+        count = result["count"]
+        if result["results"]:
+            first = result["results"][0]
+            titles.append(first["title_fr"] if lang == "fr" else first["title_ar"])
+            links.append(self.dataset_url(lang, first["id"]))
+        return titles, links, self.search_url(lang, mot), count
+
+    async def _fetch_and_store(self, mot, lang):
+        value = await self._fetch(mot, lang)
+        if self.cache is not None:
+            self.cache.put(mot, lang, value)
+        return value
+
+    async def _refresh(self, mot, lang):
+        try:
+            await self._fetch_and_store(mot, lang)
+        except Exception as e:
+            logger.error(f"An error occurred while refreshing '{mot}': {e!r}")
+        finally:
+            self._refreshing.discard((mot, lang))
+
+    async def package_search(self, mot, lang="fr"):
+        """Return (titles, links, search_url, count) for the first dataset matching mot."""
+        if self.cache is not None:
+            value, state = self.cache.get(mot, lang)
+            if state == FRESH:
+                return value
+            if state == STALE:
+                # Serve the stale entry now and refresh it once in the background.
+                if (mot, lang) not in self._refreshing:
+                    self._refreshing.add((mot, lang))
+                    asyncio.ensure_future(self._refresh(mot, lang))
+                return value
+        try:
+            return await self._fetch_and_store(mot, lang)
+        except Exception as e:
+            logger.error(f"An error occurred in package_search for '{mot}': {e!r}")
+            return [], [], "", 0  # Return empty values in case of an error
+
+    async def search_many(self, mots, lang="fr"):
+        """Run package_search for every distinct term concurrently, results in input order."""
+        unique = list(dict.fromkeys(mots))
+        results = await asyncio.gather(*(self.package_search(mot, lang) for mot in unique))
+        by_mot = dict(zip(unique, results))
+        return [by_mot[mot] for mot in mots]
+
+    def search_many_sync(self, mots, lang="fr", timeout=None):
+        loop = self._ensure_loop()
+        # Overall deadline on top of the per-request httpx timeout
+        timeout = timeout if timeout is not None else self.timeout * 2
+        return asyncio.run_coroutine_threadsafe(self.search_many(mots, lang), loop).result(timeout=timeout)
+
+    def search_sync(self, mot, lang="fr"):
+        return self.search_many_sync([mot], lang)[0]
+
+    def close(self):
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = self._client = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"An error occurred while closing the CKAN client: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+
+
+ckan_client = CkanClient(
+    os.getenv("CKAN_BASE_URL", "https://data.gov.ma/data"),
+    timeout=float(os.getenv("CKAN_TIMEOUT", "5")),
+    max_connections=int(os.getenv("CKAN_MAX_CONNECTIONS", "20")),
+    cache=build_ckan_cache(),
+)
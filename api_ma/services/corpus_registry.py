@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from utils.logging_config import logger
+
+
+class CorpusRegistry:
+    """LRU cache of the per-token corpora (vector stores) with a memory budget.
+
+    Entries are keyed by corpus name and reloaded when the mtime of one of the
+    files returned by files_for(name) changes, e.g. after gen_embed.py has
+    been rerun.
+    """
+
+    def __init__(self, loader, files_for, memory_budget_mb=1024, exclude=()):
+        self.loader = loader
+        self.files_for = files_for
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.exclude = set(exclude)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    @staticmethod
+    def _signature(paths):
+        return tuple(os.path.getmtime(path) for path in paths)
+
+    @staticmethod
+    def _estimate_size(paths):
+        # Vectors and texts are held (or mapped) as they are stored on disk.
+        return sum(os.path.getsize(path) for path in paths)
+
+    @property
+    def memory_used(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def _lookup(self, name, signature):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry["signature"] == signature:
+                self._entries.move_to_end(name)
+                return entry["corpus"]
+        return None
+
+    def get(self, name):
+        paths = self.files_for(name)
+        if not all(paths):
+            raise KeyError(f"No dataset configured for '{name}'")
+
+        signature = self._signature(paths)
+        corpus = self._lookup(name, signature)
+        if corpus is not None:
+            return corpus
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            # Another thread may have loaded the same corpus while we were waiting.
+            corpus = self._lookup(name, signature)
+            if corpus is not None:
+                return corpus
+
+            corpus = self.loader(name)
+            if corpus is None:
+                raise RuntimeError(f"Could not load the corpus '{name}'")
+            size = self._estimate_size(paths)
+
+            with self._lock:
+                self._entries[name] = {"corpus": corpus, "signature": signature, "size": size}
+                self._entries.move_to_end(name)
+                self._evict()
+            logger.info(f"Corpus '{name}' loaded ({size / (1024 * 1024):.1f} MB)")
+            return corpus
+
+    def _evict(self):
+        # Always keep the most recently used entry, even if it alone exceeds the budget.
+        while len(self._entries) > 1 and self.memory_used > self.memory_budget:
+            name, _ = self._entries.popitem(last=False)
+            logger.info(f"Corpus '{name}' evicted from the registry")
+
+    def configured_names(self):
+        names = []
+        for key in os.environ:
+            if key.endswith("_VECTOR_STORE"):
+                name = key[: -len("_VECTOR_STORE")]
+            elif key.endswith("_DATASET_PATH") and os.getenv(f"{key[: -len('_DATASET_PATH')]}_FAISS_INDEX"):
+                name = key[: -len("_DATASET_PATH")]
+            else:
+                continue
+            if name not in self.exclude and name not in names:
+                names.append(name)
+        return names
+
+    def preload(self):
+        for name in self.configured_names():
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"An error occurred while preloading corpus '{name}': {e}")
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
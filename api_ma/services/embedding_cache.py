@@ -0,0 +1,61 @@
+import hashlib
+import os
+import numpy as np
+from services.vector_store import VectorStore
+
+
+HASH_SIZE = 16
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+class EmbeddingCache:
+    """Vectors of already embedded texts, keyed by a hash of their content.
+
+    Stored next to a vector store as <prefix>.cache.npz, so that rebuilding
+    the store after a dataset update only encodes new or changed rows.
+    """
+
+    def __init__(self, vectors=None):
+        self.vectors = vectors or {}
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def __contains__(self, key):
+        return key in self.vectors
+
+    def get(self, key):
+        return self.vectors.get(key)
+
+    def update(self, items):
+        self.vectors.update(items)
+
+    @staticmethod
+    def path(prefix):
+        return f"{prefix}.cache.npz"
+
+    @classmethod
+    def load(cls, prefix):
+        path = cls.path(prefix)
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                return cls({bytes(key): vector for key, vector in zip(data["hashes"], data["vectors"])})
+        if VectorStore.exists(prefix):
+            # Store built before the cache existed: its own vectors are as good
+            store = VectorStore.load(prefix, mmap=False)
+            return cls({content_hash(text): vector for text, vector in zip(store.texts(), store.vectors())})
+        return cls()
+
+    def save(self, prefix, keys):
+        """Write the entries of keys only, so that rows deleted from the dataset are dropped."""
+        keys = list(dict.fromkeys(keys))
+        # reshape(0, -1) is ambiguous, an empty cache needs its row size spelled out
+        hashes = np.frombuffer(b"".join(keys), dtype="uint8").reshape(len(keys), HASH_SIZE)
+        vectors = np.stack([self.vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype="float32")
+        tmp_path = f"{self.path(prefix)}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=hashes, vectors=vectors.astype("float32"))
+        os.replace(tmp_path, self.path(prefix))
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.logging_config import logger
+from utils.metrics import observe_stage
+from utils.request_context import add_timing
+
+try:
+    load_dotenv("config.env")
+except Exception as e:
+    logger.error(f"An error occurred while loading the config.env file: {e}")
+    raise
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept another job."""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Bounded thread pool running the blocking model pipelines off the event loop."""
+
+    def __init__(self, max_workers, max_queue, retry_after=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+    def _get_pool(self):
+        # The pool is created on first use so that no thread exists before a fork.
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            return self._pool
+
+    @property
+    def queue_depth(self):
+        return self._pending - self._running
+
+    @property
+    def in_flight(self):
+        return self._running
+
+    async def run(self, func, *args, **kwargs):
+        """Run func in the pool and return (result, timings) with queue_wait and compute in seconds."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise QueueFullError(self.retry_after)
+            self._pending += 1
+
+        timings = {"queue_wait": 0.0, "compute": 0.0}
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            timings["queue_wait"] = started - submitted
+            observe_stage("queue", timings["queue_wait"])
+            with self._lock:
+                self._running += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings["compute"] = time.perf_counter() - started
+                add_timing("compute", timings["compute"])
+                with self._lock:
+                    self._running -= 1
+
+        def release(_):
+            with self._lock:
+                self._pending -= 1
+
+        try:
+            # Run with a copy of the request context, for the metric labels
+            future = self._get_pool().submit(contextvars.copy_context().run, job)
+        except Exception:
+            release(None)
+            raise
+        # Done callbacks also fire when a queued job is cancelled, so the slot is never leaked.
+        future.add_done_callback(release)
+        result = await asyncio.wrap_future(future)
+        return result, timings
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def server_timing(timings):
+    """Format executor timings as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={value * 1000:.1f}" for name, value in timings.items())
+
+
+inference_executor = InferenceExecutor(
+    max_workers=int(os.getenv("INFERENCE_WORKERS", "4")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE_SIZE", "32")),
+    retry_after=int(os.getenv("INFERENCE_RETRY_AFTER", "1")),
+)
@@ -4,11 +4,25 @@ import os
 import spacy
 from spellchecker import SpellChecker
 from sentence_transformers import SentenceTransformer
-import datasets
-import requests
 import re
 from utils.logging_config import logger
+from services.corpus_registry import CorpusRegistry
+from services.batching import MicroBatcher
+from services.spelling import SpellingCorrector
+from services.analysis import AnalyzedQuery, KEYWORD_EXCLUDED_POS, analyze_batch, encode_batch
+from services.ckan_client import ckan_client
+from services.model_registry import ModelRegistry
+from services.backends import backend_for, load_classifier, load_sentence_encoder
+from services.translation import Translator
+from services.intent_head import IntentHead
+from services.vector_store import corpus_files, load_corpus
+from services.index_manager import IndexManager
+from services.answer_cache import AnswerCache
+from utils.metrics import stage
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import contextvars
 from dotenv import load_dotenv
 import sys
 import warnings
@@ -69,70 +83,179 @@ except Exception as e:
 
 
 
-try:
-    #load models locally by executing init_models.sh
-    nlp_pipeline_class = pipeline("text-classification", intent_classify_model_path) #classify intents
-    model = SentenceTransformer(sentence_model_path, device="cpu") #sentence similarity
-    translation = pipeline("translation", translation_model_path) #translation from arabic to french
-    
-    #load spacy french model
-    spell = SpellChecker(language='fr')
-    nlp = spacy.load("fr_core_news_md")
-except Exception as e:
-    logger.error(f"An error occurred during model loading: {e}")
-    sys.exit(1)
+enabled_languages = [lang.strip() for lang in os.getenv("ENABLED_LANGUAGES", "fr,ar").split(",") if lang.strip()]
+
+
+#load models locally by executing init_models.sh
+models = ModelRegistry(float(os.getenv("MODEL_RETRY_INTERVAL", "30")), float(os.getenv("MODEL_RETRY_MAX_INTERVAL", "600")))
+# Versioned tag and answer indexes, rebuilt and swapped in when their files change (see main.py)
+indexes = IndexManager(load_corpus, corpus_files, debounce=float(os.getenv("INDEX_WATCH_DEBOUNCE", "2")))
+models.register("classifier", lambda: load_classifier( #classify intents
+    intent_classify_model_path, backend_for("classifier"), os.getenv("CLASSIFIER_ONNX_PATH")))
+models.register("encoder", lambda: load_sentence_encoder( #sentence similarity
+    sentence_model_path, backend_for("encoder"), os.getenv("ENCODER_ONNX_PATH")))
+# AR_INTENT_ROUTER=translate classifies the French translation of Arabic queries with the CamemBERT model,
+# AR_INTENT_ROUTER=embedding uses an intent head on the MiniLM embedding (see train_intent_head.py)
+ar_intent_router = os.getenv("AR_INTENT_ROUTER", "translate").lower()
+models.register("translator", lambda: pipeline("translation", translation_model_path), #translation from arabic to french
+                enabled="ar" in enabled_languages and ar_intent_router == "translate")
+models.register("ar_intent_head", lambda: IntentHead.load(os.getenv("AR_INTENT_HEAD_PATH")),
+                enabled="ar" in enabled_languages and ar_intent_router == "embedding")
+models.register("spellchecker", lambda: SpellChecker(language='fr'))
+# Only the tagger/morphologizer are used (POS filtering), skip the other components
+models.register("spacy", lambda: spacy.load("fr_core_news_md", disable=["parser", "ner", "lemmatizer"]))
+models.register("speller", lambda: SpellingCorrector(
+    models.get("spellchecker"),
+    models.get("spacy"),
+    cache_size=int(os.getenv("SPELL_CACHE_SIZE", "50000")),
+    table_path=os.getenv("SPELL_TABLE_PATH"),
+))
+models.register("tags_index", lambda: indexes.load("TAGS"))
+models.register("answers_fr_index", lambda: indexes.load("ANSWERS_FR"),
+                enabled="fr" in enabled_languages)
+models.register("answers_ar_index", lambda: indexes.load("ANSWERS_AR"),
+                enabled="ar" in enabled_languages)
+
+# Concurrent encode calls are grouped into one forward pass of the sentence model
+encoder = MicroBatcher(
+    lambda texts: models.get("encoder").encode(texts, convert_to_numpy=True),
+    max_batch_size=int(os.getenv("ENCODE_MAX_BATCH_SIZE", "16")),
+    max_wait_ms=float(os.getenv("ENCODE_MAX_WAIT_MS", "5")),
+    name="encoder",
+)
+
+
+def nlp_pipeline_class(text):
+    classifier = models.get("classifier")
+    with stage("classify"):
+        return classifier(text)
+
+
+# Arabic to French translation, returns the translated string
+translation = Translator(
+    lambda: models.get("translator"),
+    cache_size=int(os.getenv("TRANSLATION_CACHE_SIZE", "10000")),
+    max_batch_size=int(os.getenv("TRANSLATION_MAX_BATCH_SIZE", "8")),
+    max_wait_ms=float(os.getenv("TRANSLATION_MAX_WAIT_MS", "10")),
+    max_length=int(os.getenv("TRANSLATION_MAX_LENGTH", "128")),
+    num_beams=int(os.getenv("TRANSLATION_NUM_BEAMS", "1")),
+)
 
-try:
-
-    dataset_tags = datasets.load_dataset("json", data_files=[tags_dataset_path], split="train")
-    dataset_tags.load_faiss_index("embeddings", tags_faiss_index)
-    dataset_answers_fr = datasets.load_dataset("json", data_files=[answers_fr_dataset_path], split="train")
-    dataset_answers_fr.load_faiss_index("embeddings", answers_fr_faiss_index)
-    dataset_answers_ar = datasets.load_dataset("json", data_files=[answers_ar_dataset_path], split="train")
-    dataset_answers_ar.load_faiss_index("embeddings", answers_ar_faiss_index)
-except Exception as e:
-    logger.error(f"An error occurred while loading datasets: {e}")
-    sys.exit(1)
 
 def correct_spelling_french(text):
     try:
-        corrected_words = []
-        for word in text.split():
-            correction = spell.correction(word)
-            # Handle cases where no correction is found
-            corrected_words.append(correction if correction is not None else word)
-        corrected_text = " ".join(corrected_words)
-        return corrected_text
+        return " ".join(models.get("speller").correct_tokens(text.split()))
     except Exception as e:
         logger.error(f"An error occurred in correct_spelling_french: {e}")
         return text  # Return the original text if there is an error
-    return corrected_text
 
 
 def correct_spelling_tokens(text):
-    doc = nlp(text)
-    corr = []
-    for t in doc:
-        corr.append(correct_spelling_french(t.text))
+    try:
+        return models.get("speller").correct_text(text)
+    except Exception as e:
+        logger.error(f"An error occurred in correct_spelling_tokens: {e}")
+        return text
+
+def analyze_query(text, lang='fr'):
+    return AnalyzedQuery(text, lang, models.get("spacy"), models.get("speller"), translation, encoder)
+
+
+def analyze_queries(texts, lang='fr', parse=True):
+    return analyze_batch(texts, lang, models.get("spacy"), models.get("speller"), translation, encoder, parse)
+
+
+def encode_many(texts):
+    """One forward pass of the sentence model over a whole batch, bypassing the micro-batcher."""
+    return models.get("encoder").encode(texts, convert_to_numpy=True, batch_size=int(os.getenv("BATCH_ENCODE_SIZE", "64")))
 
-    return " ".join(corr)
 
-def search(query, data, k, lang='fr'):
+def search(query, data, k, lang='fr', corrected=False, embedding=None):
     try:
-        if lang == 'fr':
-            query = correct_spelling_tokens(query)
-        query_embedding = model.encode(query)
-        _, retrieved_examples = data.get_nearest_examples("embeddings", query_embedding, k=int(k))
+        if embedding is not None:
+            query_embedding = embedding
+        else:
+            if lang == 'fr' and not corrected:
+                query = correct_spelling_tokens(query)
+            with stage("encode"):
+                query_embedding = encoder(query)
+        with stage("search"):
+            _, retrieved_examples = data.get_nearest_examples(query_embedding, k=int(k))
         return retrieved_examples
     except Exception as e:
         logger.error(f"An error occurred during search: {e}")
         return None
         
 
+ANSWER_INDEXES = {"fr": "answers_fr_index", "ar": "answers_ar_index"}
+
+# SPECULATIVE_RETRIEVAL searches the answer and tag indexes while the intent classifier runs
+speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+_speculation_pool = None
+_speculation_lock = threading.Lock()
+
+
+def speculation_pool():
+    global _speculation_pool
+    # Created on first use so that no thread exists before a fork.
+    with _speculation_lock:
+        if _speculation_pool is None:
+            _speculation_pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("SPECULATIVE_WORKERS", "4")), thread_name_prefix="speculative")
+        return _speculation_pool
+
+
+def _retrieve(query, index_name, k, text):
+    key = (index_name, k, text)
+    if key not in query.retrievals:
+        embedding = query.embedding_for(text)
+        with models.get(index_name).use() as store:
+            query.retrievals[key] = search(text, store, k, embedding=embedding)
+    return query.retrievals[key]
+
+
+def retrieve(query, index_name, k, text):
+    """Nearest examples of text in a registry index, searched once per request."""
+    if query.speculation is not None:
+        try:
+            query.speculation.result()
+        except Exception as e:
+            logger.error(f"An error occurred during speculative retrieval: {e}")
+    return _retrieve(query, index_name, k, text)
+
+
+def retrieve_batch(queries, index_name, k, texts):
+    """Search texts[i] for queries[i] with one encoder pass and one FAISS call for the whole batch."""
+    pending = [(query, text) for query, text in zip(queries, texts) if (index_name, k, text) not in query.retrievals]
+    if not pending:
+        return
+    embeddings = encode_batch([query for query, _ in pending], [text for _, text in pending], encode_many)
+    with models.get(index_name).use() as store, stage("search"):
+        examples = store.get_nearest_examples_batch(embeddings, k=int(k))
+    for (query, text), (_, retrieved_examples) in zip(pending, examples):
+        query.retrievals[(index_name, k, text)] = retrieved_examples
+
+
+def speculate(query):
+    """Encode the answer and tag query texts in one batch and search both indexes in the background."""
+    # Resolve the lazy analysis on this thread before sharing the query with the job
+    search_text, tag_text = query.search_text, query.tag_text
+
+    def job():
+        query.prefetch_embeddings([search_text, tag_text])
+        _retrieve(query, ANSWER_INDEXES[query.lang], 1, search_text)
+        _retrieve(query, "tags_index", 2, tag_text)
+
+    # The job runs with the request context, so its stages are labelled with the request's endpoint
+    query.speculation = speculation_pool().submit(contextvars.copy_context().run, job)
+
+
 def search_general_qst(query, data, k):
     try:
-        query_embedding = model.encode(query)
-        _, retrieved_examples = data.get_nearest_examples("embeddings", query_embedding, k=int(k))
+        with stage("encode"):
+            query_embedding = encoder(query)
+        with stage("search"):
+            _, retrieved_examples = data.get_nearest_examples(query_embedding, k=int(k))
         return retrieved_examples
     except Exception as e:
         logger.error(f"An error occurred during search: {e}")
@@ -142,9 +265,9 @@ def search_general_qst(query, data, k):
 
 def keep_only_matters(text):
     try:
-        terms = nlp(text)
+        terms = models.get("spacy")(text)
         # Use a list to collect the relevant tokens
-        filtered_terms = [token.text for token in terms if token.pos_ not in ["VERB", "DET", "ADP", "PRON"]]
+        filtered_terms = [token.text for token in terms if token.pos_ not in KEYWORD_EXCLUDED_POS]
         # Join the filtered terms into a single string
         req = ' '.join(filtered_terms)
         return req
@@ -152,20 +275,23 @@ def keep_only_matters(text):
         logger.error(f"An error occurred in keep_only_matters: {e}")
         return text  # Return the input text as a fallback
 
-def create_dataset_general(data_file_path, faiss_index):
+def create_dataset_general(name):
     try:
-        dataset = datasets.load_dataset("json", data_files=[data_file_path], split="train")
-        dataset.load_faiss_index("embeddings", faiss_index)
-        return dataset
+        return load_corpus(name)
     except Exception as e:
         logger.error(f"An error occurred while creating dataset: {e}")
         return None
     
+general_corpora = CorpusRegistry(
+    create_dataset_general,
+    corpus_files,
+    memory_budget_mb=int(os.getenv("GENERAL_CORPORA_MEMORY_MB", "1024")),
+    exclude=("TAGS", "ANSWERS_FR", "ANSWERS_AR"),
+)
+
 def general_qst_v1(text, token):
     try:
-        dataset_path = os.getenv(f"{token}_DATASET_PATH")
-        faiss_index_path = os.getenv(f"{token}_FAISS_INDEX")
-        dataset = create_dataset_general(dataset_path, faiss_index_path)
+        dataset = general_corpora.get(token)
 
         quest = search_general_qst(text, dataset, 1)['text']
         return quest[0]
@@ -174,15 +300,17 @@ def general_qst_v1(text, token):
         return f"Erreur lors de la réponse sur la documentation"
 
 
-def general_v1(text, lang = 'fr'):
+def general_v1(text, lang = 'fr', query=None):
     try:
+        if query is None:
+            query = analyze_query(text, lang)
         if lang == 'fr':
             
             # res = keep_only_matters(text)
-            quest = search(text, dataset_answers_fr, 1)['text']
+            quest = retrieve(query, "answers_fr_index", 1, query.search_text)['text']
             return quest[0]
         else:
-            quest = search(text, dataset_answers_ar, 1)['text']
+            quest = retrieve(query, "answers_ar_index", 1, query.search_text)['text']
             return quest[0]
     except Exception as e:
         logger.info(f"An error occured in general_v1 : {e}")
@@ -195,25 +323,10 @@ def chercher_data(mot, lang="fr", titles=None, links=None):
     if links is None:
             links = []
     try:
-        response = requests.get(f"https://data.gov.ma/data/api/3/action/package_search", params={'q': mot})
-        res_url = f"https://data.gov.ma/data/{lang}/dataset?q={mot}"
-        if response.status_code != 200:
-            return titles, links, response.url, 0
-        result = response.json()
-        res = result["result"]
-        count = res["count"]
-        results = result["result"]["results"]
-        titre_fr = results[0]["title_fr"]
-        titre_ar = results[0]["title_ar"]
-        id = results[0]["id"]
-        if lang == "fr":
-            titles.append(titre_fr)
-            link = "https://data.gov.ma/data/fr/dataset/" + id
-            links.append(link)
-        else:
-            titles.append(titre_ar)
-            link = "https://data.gov.ma/data/ar/dataset/" + id
-            links.append(link)
+        with stage("ckan"):
+            found_titles, found_links, res_url, count = ckan_client.search_sync(mot, lang)
+        titles.extend(found_titles)
+        links.extend(found_links)
         return titles, links, res_url, count
     except Exception as e:
         logger.error(f"An error occurred in chercher_data: {e}")
@@ -242,11 +355,19 @@ def format_reponse(data, lang="fr"):
 
 
 
-def req_dt(query, lang="fr"):
+def ckan_lookup(terms, lang="fr"):
+    """CKAN package_search of every term, concurrently."""
+    with stage("ckan"):
+        return ckan_client.search_many_sync(terms, lang)
+
+
+def req_dt(query, lang="fr", rg=None):
     try:
-        rg = chercher_data(query, lang)
+        if rg is None:
+            rg = chercher_data(query, lang)
         if len(rg[0]):
-            reponse_final = format_reponse(rg, lang)
+            with stage("format"):
+                reponse_final = format_reponse(rg, lang)
             return reponse_final
         else:
             return query
@@ -254,31 +375,30 @@ def req_dt(query, lang="fr"):
         logger.error(f"An error occurred in req_dt: {e}")
         return query
       
-def request_data_v2(text, lang='fr'):
+def request_data_v2(text, lang='fr', query=None, ckan_results=None):
     try:
         reponses = []
-        req = ""
+        if query is None:
+            query = analyze_query(text, lang)
         if lang == 'fr':
-            doc = nlp(text)
-            for token in doc:
-                if token.pos_ not in ["VERB", "DET", "ADP", "PRON"]:
-                    req += f"{token.text} "
-            rs = search(req, dataset_tags, 2)
+            rs = retrieve(query, "tags_index", 2, query.tag_text)
             if rs:
                 dis = rs['text']
-                for d in dis:
-                    fre = req_dt(d)
+                found = [ckan_results[d] for d in dis] if ckan_results is not None else ckan_lookup(dis, lang)
+                for d, rg in zip(dis, found):
+                    fre = req_dt(d, lang, rg)
                     reponses.append(fre)
             result_final = get_text_of_max_number(reponses)
             if result_final:
                 return result_final
             return reponses
         else:
-            rs = search(text, dataset_tags, 2)
+            rs = retrieve(query, "tags_index", 2, query.tag_text)
             if rs:
                 dis = rs['text']
-                for d in dis:
-                    fre = req_dt(d, 'ar')
+                found = [ckan_results[d] for d in dis] if ckan_results is not None else ckan_lookup(dis, 'ar')
+                for d, rg in zip(dis, found):
+                    fre = req_dt(d, 'ar', rg)
                     reponses.append(fre)
             result_final = get_text_of_max_number(reponses)
             if result_final:
@@ -300,40 +420,72 @@ def get_text_of_max_number(data):
 
  
  
+# Responses reporting a failure are never cached
+ERROR_OUTPUTS = (
+    "Erreur lors de la réponse sur la documentation",
+    "Désolé, un problème s'est produit",
+    "Erreur lors de la classification de l'intention",
+)
+
+answer_cache = AnswerCache(
+    maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "10000")),
+    semantic_maxsize=int(os.getenv("ANSWER_CACHE_SEMANTIC_SIZE", "2000")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+)
+
+
+def invalidate_answer_cache(name, version):
+    if name == "TAGS":
+        # Tags feed the data requests of both languages
+        answer_cache.invalidate()
+    elif name in ("ANSWERS_FR", "ANSWERS_AR"):
+        answer_cache.invalidate(name[-2:].lower())
+
+
+indexes.add_listener(invalidate_answer_cache)
+
+
+def answer_intent(query, label, ckan_results=None):
+    """Response of classify_intent_v4 for an already classified query."""
+    text = query.corrected if query.lang == 'fr' else query.text
+    if label == 'LABEL_0':
+        response = general_v1(text, query.lang, query)
+        executed_function = "general_v1"
+    else:
+        response = request_data_v2(text, query.lang, query, ckan_results)
+        executed_function = "request_data"
+    return {
+        'output': response,
+        'language': query.lang,
+        'executed_function': executed_function,
+        'input_text': text
+    }
+
+
 def classify_intent_v4(text, lang='fr'):
     try:
-        executed_function = ""
-        if lang == 'fr':
-            text = correct_spelling_tokens(text)
-            label = nlp_pipeline_class(text)[0]['label']
-            if label == 'LABEL_0':
-                response = general_v1(text)
-                executed_function = "general_v1"
-            else:
-                response = request_data_v2(text)
-                executed_function = "request_data"
-            return {
-                'output': response,
-                'language': lang,
-                'executed_function': executed_function,
-                'input_text': text
-            }
+        query = analyze_query(text, lang)
+        # Semantic cache key: embedding of search_text, the same vector the answer retrieval and the
+        # Arabic intent head use, so a cache miss costs no extra encoder pass
+        embed = lambda: query.embedding
+        cached = answer_cache.get(text, lang, embed)
+        if cached is not None:
+            # The cached response may come from a differently written query
+            return {**cached, 'language': lang, 'input_text': text}
+        if speculative_retrieval:
+            speculate(query)
+        if lang == 'ar' and ar_intent_router == "embedding":
+            # One encoder pass serves both the intent head and the retrieval below
+            embedding = query.embedding
+            with stage("classify"):
+                label = models.get("ar_intent_head").predict(embedding)
         else:
-            trans = translation(text)[0]['translation_text']
-            deci = correct_spelling_tokens(trans)
-            label = nlp_pipeline_class(deci)[0]['label']
-            if label == 'LABEL_0':
-                response = general_v1(text, 'ar')
-                executed_function = "general_v1"
-            else:
-                response = request_data_v2(text, 'ar')
-                executed_function = "request_data"
-            return {
-                'output': response,
-                'language': lang,
-                'executed_function': executed_function,
-                'input_text': text
-            }
+            label = nlp_pipeline_class(query.corrected)[0]['label']
+        result = answer_intent(query, label)
+        if result['output'] is not None and result['output'] not in ERROR_OUTPUTS:
+            answer_cache.put(text, lang, result, embed, result['executed_function'])
+        return result
     except Exception as e:
         logger.error(f"An error occurred in classify_intent_v4: {e}")
         return {
@@ -342,4 +494,60 @@ def classify_intent_v4(text, lang='fr'):
             'executed_function': "error",
             'input_text': text
         }
-        
+
+
+def classify_intent_batch(texts, lang='fr'):
+    """classify_intent_v4 over a list of texts of one language, each stage running once for the whole batch."""
+    if not texts:
+        return []
+    try:
+        # Arabic queries only need translating and parsing when the classifier reads their corrected translation
+        queries = analyze_queries(texts, lang, parse=lang == 'fr' or ar_intent_router == "translate")
+        if lang == 'ar' and ar_intent_router == "embedding":
+            embeddings = encode_batch(queries, [query.search_text for query in queries], encode_many)
+            with stage("classify"):
+                labels = models.get("ar_intent_head").predict_batch(embeddings)
+        else:
+            predictions = nlp_pipeline_class([query.corrected for query in queries])
+            labels = [prediction['label'] for prediction in predictions]
+
+        general = [query for query, label in zip(queries, labels) if label == 'LABEL_0']
+        data = [query for query, label in zip(queries, labels) if label != 'LABEL_0']
+        retrieve_batch(general, ANSWER_INDEXES[lang], 1, [query.search_text for query in general])
+        retrieve_batch(data, "tags_index", 2, [query.tag_text for query in data])
+
+        # Every tag found for the batch is looked up once on CKAN
+        tags = list(dict.fromkeys(tag for query in data for tag in query.retrievals[("tags_index", 2, query.tag_text)]['text']))
+        ckan_results = dict(zip(tags, ckan_lookup(tags, lang))) if tags else {}
+    except Exception as e:
+        logger.error(f"An error occurred in classify_intent_batch: {e}")
+        return [{
+            'output': "Erreur lors de la classification de l'intention",
+            'language': lang,
+            'executed_function': "error",
+            'input_text': text
+        } for text in texts]
+
+    return [answer_intent(query, label, ckan_results) for query, label in zip(queries, labels)]
+
+
+def search_batch(texts, lang='fr', index='answers', k=1):
+    """Nearest examples of each text in the answer corpus of lang, or in the tag corpus."""
+    if not texts:
+        return []
+    try:
+        # Arabic queries are searched as written, French ones corrected
+        queries = analyze_queries(texts, lang, parse=lang == 'fr')
+        if index == 'tags':
+            index_name, query_texts = "tags_index", [query.tag_text for query in queries]
+        else:
+            index_name, query_texts = ANSWER_INDEXES[lang], [query.search_text for query in queries]
+        retrieve_batch(queries, index_name, k, query_texts)
+        return [{
+            'input_text': text,
+            'search_text': query_text,
+            'results': query.retrievals[(index_name, k, query_text)]['text']
+        } for query, text, query_text in zip(queries, texts, query_texts)]
+    except Exception as e:
+        logger.error(f"An error occurred in search_batch: {e}")
+        return [{'input_text': text, 'search_text': text, 'results': []} for text in texts]
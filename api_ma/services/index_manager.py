@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from utils.logging_config import logger
+
+
+def file_signature(paths):
+    return tuple((os.path.abspath(path), os.path.getmtime(path)) for path in paths)
+
+
+class IndexVersion:
+    def __init__(self, number, store, signature):
+        self.number = number
+        self.store = store
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.refs = 0
+        self.retired = False
+
+
+class VersionedIndex:
+    """The active version of one corpus, replaced atomically when its files change.
+
+    Searches hold a reference on the version they started with (use()), so a
+    swap never pulls an index from under an in-flight search; a retired
+    version is dropped once its last reference is released.
+    """
+
+    def __init__(self, name, loader, files_for, on_swap=None):
+        self.name = name
+        self.loader = loader
+        self.files_for = files_for
+        self.on_swap = on_swap
+        self._current = None
+        self._draining = []
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.last_error = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def load(self):
+        """Load the first version, on the calling thread."""
+        with self._build_lock:
+            if self._current is None:
+                self._swap(self._build())
+        return self
+
+    def _build(self):
+        paths = self.files_for(self.name)
+        signature = file_signature(paths)
+        start = time.perf_counter()
+        store = self.loader(self.name)
+        number = self._current.number + 1 if self._current is not None else 1
+        logger.info(f"Index '{self.name}' version {number} built in {time.perf_counter() - start:.2f}s")
+        return IndexVersion(number, store, signature)
+
+    def _swap(self, version):
+        with self._lock:
+            previous, self._current = self._current, version
+            if previous is not None:
+                previous.retired = True
+                self._draining.append(previous)
+                self._release_drained()
+
+    def _release_drained(self):
+        for version in [v for v in self._draining if v.refs == 0]:
+            self._draining.remove(version)
+            logger.info(f"Index '{self.name}' version {version.number} released")
+
+    @contextmanager
+    def use(self):
+        with self._lock:
+            version = self._current
+            version.refs += 1
+        try:
+            yield version.store
+        finally:
+            with self._lock:
+                version.refs -= 1
+                if version.retired:
+                    self._release_drained()
+
+    def refresh(self):
+        """Build a new version if the files changed since the active one, then swap it in."""
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                signature = file_signature(self.files_for(self.name))
+            except OSError:
+                # A file is being replaced, the event of the final file will trigger another refresh
+                return False
+            if self._current is not None and signature == self._current.signature:
+                return False
+            try:
+                version = self._build()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"An error occurred while building index '{self.name}', keeping the active version: {e}")
+                return False
+            self._swap(version)
+            self.last_error = None
+            if self.on_swap is not None:
+                self.on_swap(self.name, version.number)
+            return True
+        finally:
+            self._build_lock.release()
+
+    def status(self):
+        with self._lock:
+            current = self._current
+            return {
+                "version": current.number if current else None,
+                "loaded_at": current.loaded_at if current else None,
+                "rows": len(current.store) if current else None,
+                "index_type": getattr(current.store, "index_type", None) if current else None,
+                "files": [path for path, _ in current.signature] if current else None,
+                "in_flight": current.refs if current else 0,
+                "draining_versions": [v.number for v in self._draining],
+                "last_error": self.last_error,
+            }
+
+
+class _IndexFileHandler(FileSystemEventHandler):
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    # Only writes, creations and renames count: every load of the index files (a refresh in any
+    # worker included) emits open/close events, which must not schedule another refresh
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.manager.file_changed(event.src_path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.manager.file_changed(event.src_path)
+
+    def on_moved(self, event):
+        # save() and gen_embed.py write <file>.tmp and rename it over the file
+        if not event.is_directory:
+            self.manager.file_changed(event.src_path)
+            self.manager.file_changed(event.dest_path)
+
+    def on_closed(self, event):
+        # Closed after writing
+        if not event.is_directory:
+            self.manager.file_changed(event.src_path)
+
+
+class IndexManager:
+    """Versioned indexes kept in sync with the files under the watched directories.
+
+    A change to one of the files a corpus is loaded from schedules a rebuild
+    in the background, debounced so that the several files written by
+    gen_embed.py lead to a single new version.
+    """
+
+    def __init__(self, loader, files_for, debounce=2.0):
+        self.loader = loader
+        self.files_for = files_for
+        self.debounce = debounce
+        self._indexes = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._observer = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(name, version) after a new version of an index has been swapped in."""
+        self._listeners.append(callback)
+
+    def _notify(self, name, version):
+        for callback in self._listeners:
+            try:
+                callback(name, version)
+            except Exception as e:
+                logger.error(f"An error occurred in an index swap listener for '{name}': {e}")
+
+    def load(self, name):
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = VersionedIndex(name, self.loader, self.files_for, on_swap=self._notify)
+            index = self._indexes[name]
+        return index.load()
+
+    def get(self, name):
+        return self._indexes[name]
+
+    def file_changed(self, path):
+        path = os.path.abspath(path)
+        for name, index in list(self._indexes.items()):
+            current = index.current
+            watched = [p for p, _ in current.signature] if current else []
+            try:
+                watched += [os.path.abspath(p) for p in self.files_for(name)]
+            except Exception:
+                pass
+            if path in watched or any(path == f"{p}.tmp" for p in watched):
+                self.schedule_refresh(name)
+
+    def schedule_refresh(self, name):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._refresh, args=(name,))
+            timer.daemon = True
+            self._timers[name] = timer
+            timer.start()
+
+    def _refresh(self, name):
+        index = self._indexes[name]
+        if index.refresh():
+            # The files may have changed again while building
+            current = index.current
+            try:
+                if file_signature(self.files_for(name)) != current.signature:
+                    self.schedule_refresh(name)
+            except OSError:
+                pass
+
+    def refresh_all(self):
+        for name in list(self._indexes):
+            self._refresh(name)
+
+    def start_watching(self, paths):
+        """Watch the directories for index changes; call it in each worker, after the fork."""
+        if self._observer is not None:
+            return
+        observer = Observer()
+        for path in paths:
+            if os.path.isdir(path):
+                observer.schedule(_IndexFileHandler(self), path=path, recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        logger.info(f"Watching {', '.join(paths)} for index updates")
+
+    def stop_watching(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def status(self):
+        return {name: index.status() for name, index in self._indexes.items()}
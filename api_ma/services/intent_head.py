@@ -0,0 +1,69 @@
+import numpy as np
+
+KINDS = ("centroid", "logistic")
+
+
+def normalize(embeddings):
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype="float32"))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class IntentHead:
+    """Intent classifier on top of the sentence embeddings used for retrieval.
+
+    Labels are the ones of the CamemBERT intent model (LABEL_0 for general
+    questions, LABEL_1 for data requests), so the head can replace it in
+    classify_intent_v4. A "centroid" head picks the label whose normalized
+    mean embedding has the highest cosine similarity; a "logistic" head is a
+    softmax regression on the normalized embeddings.
+    """
+
+    def __init__(self, kind, labels, weights, bias):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown intent head kind '{kind}', expected one of {KINDS}")
+        self.kind = kind
+        self.labels = list(labels)
+        self.weights = np.asarray(weights, dtype="float32")
+        self.bias = np.asarray(bias, dtype="float32")
+
+    def scores(self, embeddings):
+        return normalize(embeddings) @ self.weights.T + self.bias
+
+    def predict(self, embedding):
+        return self.labels[int(np.argmax(self.scores(embedding)[0]))]
+
+    def predict_batch(self, embeddings):
+        return [self.labels[i] for i in np.argmax(self.scores(embeddings), axis=1)]
+
+    @classmethod
+    def train(cls, embeddings, labels, kind="centroid", epochs=300, learning_rate=0.5, l2=1e-4):
+        embeddings = normalize(embeddings)
+        classes = sorted(set(labels))
+        y = np.array([classes.index(label) for label in labels])
+        if kind == "centroid":
+            centroids = normalize([embeddings[y == i].mean(axis=0) for i in range(len(classes))])
+            return cls(kind, classes, centroids, np.zeros(len(classes)))
+
+        # Full-batch gradient descent on the softmax cross-entropy
+        weights = np.zeros((len(classes), embeddings.shape[1]), dtype="float32")
+        bias = np.zeros(len(classes), dtype="float32")
+        targets = np.eye(len(classes), dtype="float32")[y]
+        for _ in range(epochs):
+            logits = embeddings @ weights.T + bias
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            grad = (probs - targets) / len(embeddings)
+            weights -= learning_rate * (grad.T @ embeddings + l2 * weights)
+            bias -= learning_rate * grad.sum(axis=0)
+        return cls(kind, classes, weights, bias)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, kind=self.kind, labels=np.array(self.labels), weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["kind"]), [str(label) for label in data["labels"]], data["weights"], data["bias"])
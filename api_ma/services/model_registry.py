@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.logging_config import logger
+
+PENDING, LOADING, READY, FAILED, DISABLED = "pending", "loading", "ready", "failed", "disabled"
+
+
+class ComponentUnavailable(RuntimeError):
+    """Raised when a disabled or failed component is requested."""
+
+
+class ModelRegistry:
+    """Loads the models and indexes of the API, in parallel at startup or lazily on first use.
+
+    Every component is registered with a loader callable. Loaders may call
+    get() for the components they depend on; each component is loaded at
+    most once, under its own lock. A failed component is loaded again by a
+    later get(), at most every retry_interval seconds, doubling after each
+    consecutive failure up to max_retry_interval; requests in between fail
+    fast instead of each waiting for a load that is likely to fail again.
+    """
+
+    def __init__(self, retry_interval=30.0, max_retry_interval=600.0):
+        self._components = OrderedDict()
+        self._thread = None
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+    def register(self, name, loader, enabled=True):
+        self._components[name] = {
+            "loader": loader,
+            "state": PENDING if enabled else DISABLED,
+            "value": None,
+            "load_time": None,
+            "error": None,
+            "failures": 0,
+            "retry_at": 0.0,
+            "lock": threading.Lock(),
+        }
+
+    def get(self, name):
+        component = self._components[name]
+        if component["state"] == READY:
+            return component["value"]
+        if component["state"] == DISABLED:
+            raise ComponentUnavailable(f"Component '{name}' is disabled in this deployment")
+        with component["lock"]:
+            if component["state"] == PENDING or (component["state"] == FAILED and time.monotonic() >= component["retry_at"]):
+                self._load(name, component)
+        if component["state"] != READY:
+            raise ComponentUnavailable(f"Component '{name}' failed to load: {component['error']}")
+        return component["value"]
+
+    def peek(self, name):
+        """Return the component if it is already loaded, without triggering a load."""
+        component = self._components.get(name)
+        return component["value"] if component and component["state"] == READY else None
+
+    def _load(self, name, component):
+        component["state"] = LOADING
+        start = time.perf_counter()
+        try:
+            component["value"] = component["loader"]()
+            component["state"] = READY
+            component["error"] = None
+            component["failures"] = 0
+            logger.info(f"Component '{name}' loaded in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            component["state"] = FAILED
+            component["error"] = str(e)
+            delay = min(self.retry_interval * 2 ** component["failures"], self.max_retry_interval)
+            component["failures"] += 1
+            component["retry_at"] = time.monotonic() + delay
+            logger.error(f"An error occurred while loading component '{name}', next attempt in {delay:.0f}s: {e}")
+        finally:
+            component["load_time"] = time.perf_counter() - start
+
+    def _try_get(self, name):
+        try:
+            self.get(name)
+        except ComponentUnavailable:
+            pass
+
+    def load_all(self, max_workers=None):
+        """Load every enabled component in parallel and block until all are done."""
+        names = [name for name, c in self._components.items() if c["state"] in (PENDING, FAILED)]
+        if not names:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers or len(names), thread_name_prefix="model-loader") as pool:
+            list(pool.map(self._try_get, names))
+
+    def start_loading(self, max_workers=None):
+        """Load every enabled component in the background, so the server can answer /ready meanwhile."""
+        if self._thread is None and not self.is_ready():
+            self._thread = threading.Thread(target=self.load_all, args=(max_workers,), name="model-registry", daemon=True)
+            self._thread.start()
+
+    def is_ready(self):
+        return all(c["state"] in (READY, DISABLED) for c in self._components.values())
+
+    def status(self):
+        return {
+            name: {
+                "state": c["state"],
+                "load_time_s": round(c["load_time"], 3) if c["load_time"] is not None else None,
+                "error": c["error"],
+            }
+            for name, c in self._components.items()
+        }
@@ -0,0 +1,70 @@
+import json
+import os
+import re
+from utils.cache import LRUCache
+from utils.logging_config import logger
+
+# Tokens made only of digits, punctuation or symbols are never sent to the spellchecker
+SKIP_TOKEN = re.compile(r"^[\W\d_]+$")
+
+
+def load_correction_table(table_path):
+    """Load a precomputed {token: correction} table, or an empty one if it is missing."""
+    if not table_path or not os.path.isfile(table_path):
+        return {}
+    try:
+        with open(table_path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        logger.info(f"Loaded {len(table)} precomputed spelling corrections from {table_path}")
+        return table
+    except Exception as e:
+        logger.error(f"An error occurred while loading the correction table {table_path}: {e}")
+        return {}
+
+
+class SpellingCorrector:
+    """Memoized French spelling correction on top of pyspellchecker."""
+
+    def __init__(self, spell, nlp, cache_size=50000, table_path=None):
+        self.spell = spell
+        self.nlp = nlp
+        self.table = load_correction_table(table_path)
+        self.words = LRUCache(cache_size)
+        self.texts = LRUCache(cache_size)
+
+    def should_check(self, word):
+        return not SKIP_TOKEN.match(word) and not self.spell.known([word])
+
+    def correct_word(self, word):
+        correction = self.table.get(word)
+        if correction is not None:
+            return correction
+        correction = self.words.get(word)
+        if correction is not None:
+            return correction
+        correction = self.spell.correction(word) if self.should_check(word) else None
+        # Handle cases where no correction is found
+        correction = correction if correction is not None else word
+        self.words.put(word, correction)
+        return correction
+
+    def correct_tokens(self, tokens):
+        corrected = []
+        for token in tokens:
+            corrected.append(" ".join(self.correct_word(word) for word in token.split()))
+        return corrected
+
+    def correct_text(self, text, doc=None):
+        corrected = self.texts.get(text)
+        if corrected is not None:
+            return corrected
+        if doc is None:
+            doc = self.nlp(text)
+        corrected = " ".join(self.correct_tokens(t.text for t in doc))
+        self.texts.put(text, corrected)
+        # Corrected text is a fixed point: correcting it again must not recompute anything.
+        self.texts.put(corrected, corrected)
+        return corrected
+
+    def stats(self):
+        return {"table_size": len(self.table), "words": self.words.stats(), "texts": self.texts.stats()}
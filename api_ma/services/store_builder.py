@@ -0,0 +1,111 @@
+import json
+import math
+import os
+import faiss
+import numpy as np
+from services.vector_store import VectorStore, create_index, normalize
+from utils.logging_config import logger
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class StoreBuilder:
+    """Builds a vector store chunk by chunk, with checkpoints to resume an interrupted build.
+
+    Texts are appended to <prefix>.build.texts.bin as they come; the index,
+    the offsets and a checkpoint record (<prefix>.build.checkpoint.json) are written
+    after every chunk. finish() moves the work files over the store files.
+    """
+
+    def __init__(self, prefix, index_type="flat", source=None, expected_rows=None):
+        self.prefix = prefix
+        self.work_prefix = f"{prefix}.build"
+        self.index_type = index_type
+        self.source = source
+        self.expected_rows = expected_rows
+        self.index = None
+        self.offsets = [0]
+        self._payload = None
+
+    @property
+    def rows(self):
+        return len(self.offsets) - 1
+
+    @property
+    def checkpoint_path(self):
+        return f"{self.work_prefix}.checkpoint.json"
+
+    def resume(self):
+        """Reload the last checkpoint of the same source and index type, return the rows already built."""
+        index_path, payload_path, offsets_path, _ = VectorStore.files(self.work_prefix)
+        if os.path.isfile(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+            same_build = checkpoint["source"] == self.source and checkpoint["index_type"] == self.index_type
+            if same_build:
+                self.index = faiss.read_index(index_path)
+                self.offsets = np.load(offsets_path).tolist()
+            if same_build and self.index.ntotal == self.rows == checkpoint["rows"]:
+                self._payload = open(payload_path, "r+b")
+                # Drop the texts appended after the checkpoint
+                self._payload.truncate(self.offsets[-1])
+                self._payload.seek(self.offsets[-1])
+                logger.info(f"Resuming the build of {self.prefix} at row {self.rows}")
+                return self.rows
+            logger.info(f"Discarding the checkpoint of {self.prefix}, the dataset or index type changed "
+                        f"or the build stopped while checkpointing")
+            self.index, self.offsets = None, [0]
+        self._payload = open(payload_path, "wb")
+        return 0
+
+    def _create_index(self, embeddings):
+        nlist = None
+        if self.index_type == "ivf":
+            # Lists are sized for the whole corpus, but trained on the first chunk
+            n = self.expected_rows or len(embeddings)
+            nlist = max(1, min(int(4 * math.sqrt(n)), len(embeddings) // 39))
+        index = create_index(embeddings.shape[1], self.index_type, len(embeddings), nlist=nlist)
+        if not index.is_trained:
+            index.train(embeddings)
+        return index
+
+    def add(self, embeddings, texts):
+        embeddings = normalize(embeddings)
+        if self.index is None:
+            self.index = self._create_index(embeddings)
+        self.index.add(embeddings)
+        for text in texts:
+            encoded = text.encode("utf-8")
+            self._payload.write(encoded)
+            self.offsets.append(self.offsets[-1] + len(encoded))
+
+    def checkpoint(self):
+        index_path, _, offsets_path, _ = VectorStore.files(self.work_prefix)
+        self._payload.flush()
+        os.fsync(self._payload.fileno())
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        with open(f"{offsets_path}.tmp", "wb") as f:
+            np.save(f, np.asarray(self.offsets, dtype="int64"))
+        os.replace(f"{offsets_path}.tmp", offsets_path)
+        checkpoint = {"source": self.source, "index_type": self.index_type, "rows": self.rows}
+        with open(f"{self.checkpoint_path}.tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(f"{self.checkpoint_path}.tmp", self.checkpoint_path)
+
+    def finish(self):
+        """Write the last checkpoint and swap the work files in as the store."""
+        if self.index is None:
+            raise ValueError(f"No rows were added to {self.prefix}")
+        self.checkpoint()
+        self._payload.close()
+        meta = {"index_type": self.index_type, "count": self.rows, "dim": self.index.d}
+        with open(f"{self.work_prefix}.meta.tmp", "w") as f:
+            json.dump(meta, f)
+        for work_path, path in zip(VectorStore.files(self.work_prefix)[:3], VectorStore.files(self.prefix)[:3]):
+            os.replace(work_path, path)
+        os.replace(f"{self.work_prefix}.meta.tmp", VectorStore.files(self.prefix)[3])
+        os.remove(self.checkpoint_path)
@@ -0,0 +1,75 @@
+import re
+import time
+from services.batching import MicroBatcher
+from utils.cache import LRUCache
+from utils.latency import LatencyWindow
+
+# Harakat, Quranic marks and superscript alef carry no meaning for intent or retrieval
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+TATWEEL = "\u0640"
+
+
+def normalize_arabic(text):
+    text = ARABIC_DIACRITICS.sub("", text).replace(TATWEEL, "")
+    return " ".join(text.split())
+
+
+class Translator:
+    """Arabic to French translation with a cache, micro-batching and latency metrics.
+
+    Calls are keyed on the normalized Arabic text. Cache misses from
+    concurrent requests are grouped into one generate() call with greedy
+    decoding and a capped output length, which suits short chat queries.
+    """
+
+    def __init__(self, load_pipeline, cache_size=10000, max_batch_size=8, max_wait_ms=10, max_length=128, num_beams=1):
+        self.load_pipeline = load_pipeline
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.cache = LRUCache(cache_size)
+        self.batcher = MicroBatcher(self._translate_batch, max_batch_size, max_wait_ms, name="translator")
+        self.latency = LatencyWindow()
+        self.model_latency = LatencyWindow()
+
+    def _translate_batch(self, texts):
+        start = time.perf_counter()
+        outputs = self.load_pipeline()(
+            texts,
+            batch_size=len(texts),
+            num_beams=self.num_beams,
+            do_sample=False,
+            max_length=self.max_length,
+        )
+        self.model_latency.record(time.perf_counter() - start)
+        return [output["translation_text"] for output in outputs]
+
+    def __call__(self, text):
+        start = time.perf_counter()
+        key = normalize_arabic(text)
+        translated = self.cache.get(key)
+        if translated is None:
+            translated = self.batcher(key)
+            self.cache.put(key, translated)
+        self.latency.record(time.perf_counter() - start)
+        return translated
+
+    def map(self, texts):
+        """Translate a list of texts, sending every distinct cache miss to the model in one batch."""
+        start = time.perf_counter()
+        keys = [normalize_arabic(text) for text in texts]
+        translated = {key: self.cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, value in translated.items() if value is None]
+        for key, value in zip(missing, self.batcher.map(missing)):
+            self.cache.put(key, value)
+            translated[key] = value
+        if texts:
+            self.latency.record((time.perf_counter() - start) / len(texts))
+        return [translated[key] for key in keys]
+
+    def stats(self):
+        return {
+            "cache": self.cache.stats(),
+            "batching": self.batcher.stats(),
+            "latency": self.latency.summary(),
+            "model_batch_latency": self.model_latency.summary(),
+        }
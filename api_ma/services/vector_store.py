@@ -0,0 +1,291 @@
+import fcntl
+import json
+import math
+import os
+import faiss
+import numpy as np
+from utils.logging_config import logger
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+
+def read_texts(path_data):
+    """Texts of a JSON list (strings or {"text": ...} records) or of a JSONL file."""
+    with open(path_data, "r", encoding="utf-8") as f:
+        if path_data.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    return [item["text"] if isinstance(item, dict) else item for item in items]
+
+
+def iter_texts(path_data, read_size=1 << 20):
+    """Stream the texts of a JSON list or JSONL file without loading the whole file."""
+    with open(path_data, "r", encoding="utf-8") as f:
+        if path_data.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item["text"] if isinstance(item, dict) else item
+            return
+
+        decoder = json.JSONDecoder()
+        buffer, pos, started = "", 0, False
+        while True:
+            chunk = f.read(read_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path_data} is not a JSON list")
+                    started, pos = True, pos + 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+                    break  # Item cut by the end of the read, wait for more data
+                yield item["text"] if isinstance(item, dict) else item
+            if not chunk:
+                return
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def normalize(embeddings):
+    embeddings = np.ascontiguousarray(np.atleast_2d(embeddings), dtype="float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def pack_texts(texts):
+    """Concatenate UTF-8 encoded texts into one byte array plus an offsets array."""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype="uint8"), offsets
+
+
+def create_index(dim, index_type="flat", n_vectors=0, nlist=None, hnsw_m=32, ef_construction=80):
+    """Empty cosine (inner product on normalized vectors) index of the given type."""
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "ivf":
+        # Rule of thumb: ~4*sqrt(n) lists, with at least 39 training points per list
+        nlist = nlist or max(1, min(int(4 * math.sqrt(max(n_vectors, 1))), n_vectors // 39))
+        return faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    if nprobe and hasattr(index, "nprobe"):
+        index.nprobe = nprobe
+    if ef_search and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+class VectorStore:
+    """Normalized sentence embeddings behind a FAISS index, with a compact text payload.
+
+    On disk a store is a prefix with four files: <prefix>.index (FAISS),
+    <prefix>.texts.bin (concatenated UTF-8 texts), <prefix>.offsets.npy
+    (start of each text) and <prefix>.json (metadata). Everything is
+    memory-mapped on load, so workers share the pages and only the rows
+    returned by a search are ever decoded.
+    """
+
+    def __init__(self, index, payload, offsets, index_type="flat", name=""):
+        if index.ntotal != len(offsets) - 1:
+            raise ValueError(f"Index has {index.ntotal} vectors but the payload has {len(offsets) - 1} texts")
+        self.index = index
+        self.payload = payload
+        self.offsets = offsets
+        self.index_type = index_type
+        self.name = name
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def text(self, i):
+        return bytes(self.payload[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def texts(self):
+        return [self.text(i) for i in range(len(self))]
+
+    def vectors(self):
+        """The normalized vectors of every row, in row order."""
+        if hasattr(self.index, "make_direct_map"):
+            # IVF indexes can only reconstruct rows through a direct map
+            self.index.make_direct_map()
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    @property
+    def nbytes(self):
+        vectors = self.index.ntotal * self.index.d * 4
+        return vectors + self.payload.nbytes + self.offsets.nbytes
+
+    def search(self, embeddings, k):
+        """Return (scores, ids) for a batch of query embeddings."""
+        return self.index.search(normalize(embeddings), int(k))
+
+    def get_nearest_examples(self, query_embedding, k=10):
+        """Same shape as datasets' get_nearest_examples: (scores, {"text": [...]})."""
+        scores, ids = self.search(query_embedding, k)
+        hits = [i for i in ids[0] if i >= 0]
+        return scores[0][:len(hits)].tolist(), {"text": [self.text(i) for i in hits]}
+
+    def get_nearest_examples_batch(self, query_embeddings, k=10):
+        scores, ids = self.search(query_embeddings, k)
+        results = []
+        for row_scores, row_ids in zip(scores, ids):
+            hits = [i for i in row_ids if i >= 0]
+            results.append((row_scores[:len(hits)].tolist(), {"text": [self.text(i) for i in hits]}))
+        return results
+
+    @classmethod
+    def build(cls, embeddings, texts, index_type="flat", name="", **params):
+        embeddings = normalize(embeddings)
+        index = create_index(embeddings.shape[1], index_type, len(embeddings), **params)
+        if not index.is_trained:
+            index.train(embeddings)
+        index.add(embeddings)
+        payload, offsets = pack_texts(texts)
+        return cls(index, payload, offsets, index_type, name)
+
+    @classmethod
+    def from_legacy(cls, dataset_path, faiss_index_path, index_type="flat", name="", **params):
+        """Build a store from a dataset JSON and the L2 IndexFlat written by older gen_embed.py versions."""
+        legacy = faiss.read_index(faiss_index_path)
+        vectors = legacy.reconstruct_n(0, legacy.ntotal)
+        return cls.build(vectors, read_texts(dataset_path), index_type, name, **params)
+
+    @staticmethod
+    def files(prefix):
+        return [f"{prefix}.index", f"{prefix}.texts.bin", f"{prefix}.offsets.npy", f"{prefix}.json"]
+
+    @classmethod
+    def exists(cls, prefix):
+        return bool(prefix) and all(os.path.isfile(path) for path in cls.files(prefix))
+
+    def save(self, prefix):
+        """Write the store next to prefix; each file is replaced atomically."""
+        index_path, payload_path, offsets_path, meta_path = self.files(prefix)
+        meta = {"index_type": self.index_type, "count": len(self), "dim": self.index.d}
+
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        np.asarray(self.payload).tofile(f"{payload_path}.tmp")
+        with open(f"{offsets_path}.tmp", "wb") as f:
+            np.save(f, np.asarray(self.offsets))
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        for path in (index_path, payload_path, offsets_path, meta_path):
+            os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, prefix, mmap=True, name="", nprobe=None, ef_search=None):
+        index_path, payload_path, offsets_path, meta_path = cls.files(prefix)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            except Exception as e:
+                logger.warning(f"Could not memory-map {index_path}, loading it in memory: {e}")
+        if index is None:
+            index = faiss.read_index(index_path)
+        configure_search(index, nprobe, ef_search)
+        if os.path.getsize(payload_path):
+            payload = np.memmap(payload_path, dtype="uint8", mode="r") if mmap else np.fromfile(payload_path, dtype="uint8")
+        else:
+            payload = np.zeros(0, dtype="uint8")
+        offsets = np.load(offsets_path, mmap_mode="r" if mmap else None)
+        return cls(index, payload, offsets, meta.get("index_type", "flat"), name)
+
+
+def legacy_files(name):
+    """The {NAME}_DATASET_PATH/{NAME}_FAISS_INDEX pair of a corpus, or None when it is not fully configured."""
+    dataset_path, faiss_index_path = os.getenv(f"{name}_DATASET_PATH"), os.getenv(f"{name}_FAISS_INDEX")
+    return (dataset_path, faiss_index_path) if dataset_path and faiss_index_path else None
+
+
+def store_is_current(prefix, legacy):
+    """True when the store exists and was written after the legacy files it may have been converted from."""
+    if not VectorStore.exists(prefix):
+        return False
+    if legacy is None:
+        return True
+    written = min(os.path.getmtime(path) for path in VectorStore.files(prefix))
+    return all(written >= os.path.getmtime(path) for path in legacy if os.path.isfile(path))
+
+
+def corpus_files(name):
+    """Files a corpus is loaded from: its native store if built, else the dataset JSON and legacy index.
+
+    The legacy pair is kept next to the store files, so that replacing it
+    also rebuilds a store converted from it.
+    """
+    prefix = os.getenv(f"{name}_VECTOR_STORE")
+    legacy = legacy_files(name)
+    if VectorStore.exists(prefix):
+        return VectorStore.files(prefix) + [path for path in legacy or () if os.path.isfile(path)]
+    return [os.getenv(f"{name}_DATASET_PATH"), os.getenv(f"{name}_FAISS_INDEX")]
+
+
+def load_corpus(name):
+    """Load the corpus NAME configured by {NAME}_VECTOR_STORE, or by the legacy {NAME}_DATASET_PATH/{NAME}_FAISS_INDEX pair.
+
+    A legacy pair is converted to a store once: when {NAME}_VECTOR_STORE is
+    set the conversion is saved there and memory-mapped by every later load,
+    until the legacy files change. {NAME}_INDEX_TYPE (flat, ivf or hnsw,
+    default VECTOR_INDEX_TYPE) applies to the conversion; VECTOR_NPROBE and
+    VECTOR_EF_SEARCH tune the approximate indexes at query time.
+    """
+    nprobe = int(os.getenv("VECTOR_NPROBE", "16"))
+    ef_search = int(os.getenv("VECTOR_EF_SEARCH", "64"))
+    mmap = os.getenv("FAISS_MMAP", "true").lower() == "true"
+    prefix = os.getenv(f"{name}_VECTOR_STORE")
+    legacy = legacy_files(name)
+    if store_is_current(prefix, legacy):
+        return VectorStore.load(prefix, mmap=mmap, name=name, nprobe=nprobe, ef_search=ef_search)
+
+    if legacy is None:
+        raise KeyError(f"No vector store or dataset configured for '{name}'")
+    dataset_path, faiss_index_path = legacy
+    index_type = os.getenv(f"{name}_INDEX_TYPE", os.getenv("VECTOR_INDEX_TYPE", "flat")).lower()
+    if not prefix:
+        logger.info(f"Building the {index_type} vector store of '{name}' from {faiss_index_path}, "
+                    f"set {name}_VECTOR_STORE to build it once on disk")
+        store = VectorStore.from_legacy(dataset_path, faiss_index_path, index_type, name)
+        configure_search(store.index, nprobe, ef_search)
+        return store
+
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    with open(f"{prefix}.lock", "w") as lock:
+        # Workers starting together convert the corpus once, the others wait and load the result
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not store_is_current(prefix, legacy):
+            logger.info(f"Converting '{name}' from {faiss_index_path} to a {index_type} vector store at {prefix}")
+            VectorStore.from_legacy(dataset_path, faiss_index_path, index_type, name).save(prefix)
+    return VectorStore.load(prefix, mmap=mmap, name=name, nprobe=nprobe, ef_search=ef_search)
@@ -89,4 +89,6 @@ if __name__ == "__main__":
     args = parser.parse_args()
     
     result = generate_token(args.text)
-    logger.info(f"Token generated successfully: {result['token']}")
\ No newline at end of file
+    # Printed for the operator only, tokens are never written to the logs
+    logger.info(f"Token generated successfully for '{args.text}', written to tokens.env")
+    print(result['token'])
\ No newline at end of file
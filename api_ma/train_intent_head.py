@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import random
+import sys
+import numpy as np
+from dotenv import load_dotenv
+from utils.logging_config import logger
+import warnings
+
+# Ignore all warnings
+warnings.filterwarnings("ignore")
+
+try:
+    load_dotenv('config.env')
+except Exception as e:
+    logger.error(f" {e}")
+    sys.exit(1)
+
+from services.intent_head import IntentHead, KINDS
+
+
+def load_examples(path_data):
+    """Load {"text": ..., "label": ...} examples from a JSON list or a JSONL file."""
+    with open(path_data, "r", encoding="utf-8") as f:
+        if path_data.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def teacher_labels(texts):
+    """Label texts with the current translate -> correct -> CamemBERT route of classify_intent_v4."""
+    from services.functions import models, correct_spelling_tokens
+    from transformers import pipeline
+
+    translator = pipeline("translation", os.getenv("translation_model_path"))
+    classifier = models.get("classifier")
+    labels = []
+    for text in texts:
+        french = translator(text)[0]["translation_text"]
+        labels.append(classifier(correct_spelling_tokens(french))[0]["label"])
+    return labels
+
+
+def train(path_data, output, kind, holdout, use_teacher):
+    try:
+        examples = load_examples(path_data)
+        texts = [example["text"] for example in examples]
+        if use_teacher:
+            labels = teacher_labels(texts)
+        else:
+            labels = [example["label"] for example in examples]
+
+        from services.backends import backend_for, load_sentence_encoder
+        encoder = load_sentence_encoder(os.getenv("sentence_model_path"), backend_for("encoder"), os.getenv("ENCODER_ONNX_PATH"))
+        embeddings = encoder.encode(texts, convert_to_numpy=True, batch_size=64, show_progress_bar=True)
+
+        order = list(range(len(texts)))
+        random.Random(0).shuffle(order)
+        n_test = int(len(order) * holdout)
+        test, fit = order[:n_test], order[n_test:]
+        head = IntentHead.train(embeddings[fit], [labels[i] for i in fit], kind)
+        if test:
+            predicted = head.predict_batch(embeddings[test])
+            accuracy = np.mean([p == labels[i] for p, i in zip(predicted, test)])
+            print(f"Held-out accuracy on {len(test)} examples: {accuracy:.1%}")
+
+        # Final head on every example
+        head = IntentHead.train(embeddings, labels, kind)
+        head.save(output)
+        logger.info(f"Arabic intent head ({kind}, {len(texts)} examples) saved to {output}")
+    except Exception as e:
+        logger.error(f"An error occurred while training the intent head: {e}")
+        print(f"An error occurred: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Arabic intent head on sentence embeddings.")
+    parser.add_argument("path_data", type=str, help="JSON/JSONL file of {\"text\", \"label\"} examples (LABEL_0 or LABEL_1).")
+    parser.add_argument("--output", type=str, default=os.getenv("AR_INTENT_HEAD_PATH", "./embeddings/AR_INTENT_HEAD.npz"))
+    parser.add_argument("--kind", type=str, choices=KINDS, default="centroid")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of examples kept aside to report accuracy.")
+    parser.add_argument("--teacher", action="store_true",
+                        help="Ignore the labels of the file and label the texts with the translation route.")
+    args = parser.parse_args()
+
+    train(args.path_data, args.output, args.kind, args.holdout, args.teacher)
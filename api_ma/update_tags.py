@@ -1,68 +1,137 @@
 import json
-import requests
 import re
 import argparse
+import asyncio
 import os
+import unicodedata
+import httpx
+from dotenv import load_dotenv
 
 
 DATASETS_PATH = "./datasets"
 
-def get_new_data():
-  link_tags = "https://data.gov.ma/data/api/3/action/tag_list"
-  link_titres = "https://data.gov.ma/data/api/3/action/package_list"
+load_dotenv("config.env")
 
-  try:
-    tags_req = requests.get(link_tags)
-    titres_req = requests.get(link_titres)
-  except Exception as e:
-    print(f"Error in fetching data from links : {link_tags} and {link_titres} ")
-    exit(1)
 
-  result_tags = tags_req.json()["result"]
-  result_titres = titres_req.json()["result"]
+def normalize_key(text):
+    """Key used to dedupe tags: case, accents composition and spacing do not matter."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+async def fetch_action(client, base_url, action, page_size=1000, retries=3):
+    """All items of a CKAN list action, page by page, retrying failed pages with backoff."""
+    items = []
+    seen = set()
+    offset = 0
+    while True:
+        for attempt in range(retries + 1):
+            try:
+                response = await client.get(f"{base_url}/api/3/action/{action}",
+                                            params={"limit": page_size, "offset": offset})
+                response.raise_for_status()
+                page = response.json()["result"]
+                break
+            except Exception as e:
+                if attempt == retries:
+                    raise RuntimeError(f"{action} failed at offset {offset}: {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        # Portals that ignore limit/offset return everything on every page
+        new = [item for item in page if item not in seen]
+        items.extend(new)
+        seen.update(new)
+        if len(page) < page_size or not new:
+            return items
+        offset += page_size
+
+
+async def get_new_data(base_url, timeout=10.0, page_size=1000, retries=3):
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        result_tags, result_titres = await asyncio.gather(
+            fetch_action(client, base_url, "tag_list", page_size, retries),
+            fetch_action(client, base_url, "package_list", page_size, retries),
+        )
+    result_titres = [re.sub("-", " ", titre) for titre in result_titres]
+    return result_tags + result_titres
 
-  result_titres = [re.sub("-", " ", titre) for titre in result_titres]
-  result_merged = result_tags + result_titres
-  return result_merged
 
 def load_json(data_path):
-  try:
-    with open(data_path, "r") as f:
-      data = json.load(f)
-      return data
-  except FileNotFoundError:
-    print("File not found")
-    exit(1)
-
-def add_to_json(data_path, updated_path):
-  try:
-    count = 0
-    data = get_new_data()
+    try:
+        with open(data_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("File not found")
+        exit(1)
+
+
+def diff_tags(origin, remote, prune=False):
+    """Merge the remote tags into origin, keeping its order, and return (merged, added, removed)."""
+    remote_keys = {}
+    for item in remote:
+        remote_keys.setdefault(normalize_key(item), item)
+    origin_keys = {normalize_key(item) for item in origin}
+
+    added = [item for key, item in remote_keys.items() if key not in origin_keys]
+    removed = [item for item in origin if normalize_key(item) not in remote_keys]
+    kept = [item for item in origin if normalize_key(item) in remote_keys] if prune else list(origin)
+    return kept + added, added, removed
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def sync_tags(data_path, updated_path, base_url, prune=False, diff_path=None, timeout=10.0, page_size=1000, retries=3):
+    try:
+        remote = asyncio.run(get_new_data(base_url, timeout, page_size, retries))
+    except Exception as e:
+        print(f"Error in fetching data from {base_url} : {e}")
+        exit(1)
+
     origin = load_json(data_path)
-    count = len(data) - len(origin)
-    for rs in data:
-      if rs not in origin:
-        origin.append(rs)
-    print(f"Added {count} new items to {data_path}")
-    with open(updated_path, "w") as f:
-      json.dump(origin, f)
-    print(f"Updated file saved to {updated_path}")
-  except Exception as e:
-    print(f"Error in adding to json file : {e}")
-    exit(1)
+    merged, added, removed = diff_tags(origin, remote, prune)
+    print(f"{len(added)} tags added, {len(removed)} {'removed' if prune else 'no longer on the portal (kept, use --prune)'}")
+
+    diff_path = diff_path or f"{updated_path}.diff.json"
+    write_json(diff_path, {"added": added, "removed": removed, "pruned": prune})
+    print(f"Diff saved to {diff_path}")
+
+    if merged != origin or updated_path != data_path:
+        write_json(updated_path, merged)
+        print(f"Updated file saved to {updated_path}")
+    return added, removed, merged != origin
+
 
 def validate_paths(data_path, updated_path):
     # Ensure both paths are in the datasets directory
     if not (data_path.startswith(DATASETS_PATH) and updated_path.startswith(DATASETS_PATH)):
         print(f"Both data_path and updated_path must be within the datasets directory : {DATASETS_PATH}.")
         exit(1)
-        
+
 if __name__ == "__main__":
     # Configuration de l'analyseur d'arguments pour la ligne de commande
-    parser = argparse.ArgumentParser(description="Add new items to the json file")
+    parser = argparse.ArgumentParser(description="Sync the json file of tags with the CKAN portal")
     parser.add_argument("data_path", type=str, help="Path to the json file")
     parser.add_argument("updated_path", type=str, help="Path to the updated json file")
+    parser.add_argument("--base-url", type=str, default=os.getenv("CKAN_BASE_URL", "https://data.gov.ma/data"))
+    parser.add_argument("--prune", action="store_true", help="Also remove the tags that are no longer on the portal")
+    parser.add_argument("--diff", type=str, default=None, help="Where to write the diff, <updated_path>.diff.json by default")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("CKAN_TIMEOUT", "10")))
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--embed", type=str, default=None, metavar="NAME",
+                        help="Update the embeddings of dataset NAME (e.g. TAGS) incrementally, only the added tags are encoded")
     args = parser.parse_args()
-    
+
     validate_paths(args.data_path, args.updated_path)
-    add_to_json(args.data_path, args.updated_path)
+    added, removed, changed = sync_tags(args.data_path, args.updated_path, args.base_url, args.prune, args.diff,
+                                        args.timeout, args.page_size, args.retries)
+
+    if args.embed and changed:
+        # Imported here: loading the sentence model is only needed when embeddings are updated
+        from gen_embed import generate_embeddings
+        generate_embeddings(args.embed, args.updated_path, incremental=True,
+                            batch_size=int(os.getenv("EMBED_BATCH_SIZE", "64")),
+                            workers=int(os.getenv("EMBED_WORKERS", "0")) or os.cpu_count())
@@ -0,0 +1,108 @@
+"""Local stand-in for the data.gov.ma CKAN API, used to measure latency and error handling offline.
+
+    python -m utils.ckan_stub --port 8081 --latency-ms 80 --error-rate 0.05
+
+then set CKAN_BASE_URL=http://127.0.0.1:8081/data in config.env.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = "/data/api/3/action/"
+
+
+def fake_dataset(term):
+    digest = hashlib.sha1(term.encode("utf-8")).hexdigest()
+    return {
+        "id": f"stub-{digest[:12]}",
+        "name": term.replace(" ", "-"),
+        "title_fr": f"Jeu de données : {term}",
+        "title_ar": f"مجموعة بيانات: {term}",
+    }
+
+
+class StubCkanHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    empty_terms = frozenset()
+    tags = []
+    packages = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self._send(500, {"success": False, "error": {"message": "stub failure"}})
+        if not url.path.startswith(API_PREFIX):
+            return self._send(404, {"success": False})
+
+        action = url.path[len(API_PREFIX):]
+        if action == "package_search":
+            term = params.get("q", "")
+            rows = int(params.get("rows", 10))
+            if term in self.empty_terms:
+                return self._send(200, {"success": True, "result": {"count": 0, "results": []}})
+            count = int(hashlib.sha1(term.encode("utf-8")).hexdigest()[:4], 16) % 200 + 1
+            results = [fake_dataset(term)][:rows]
+            return self._send(200, {"success": True, "result": {"count": count, "results": results}})
+        if action in ("tag_list", "package_list"):
+            items = self.tags if action == "tag_list" else self.packages
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", len(items)))
+            return self._send(200, {"success": True, "result": items[offset:offset + limit]})
+        return self._send(404, {"success": False})
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=0, error_rate=0.0, empty_terms=(), tags=(), packages=()):
+    """Start the stub in a daemon thread and return (server, base_url) for CKAN_BASE_URL."""
+    handler = type("ConfiguredStubCkanHandler", (StubCkanHandler,), {
+        "latency": latency_ms / 1000,
+        "error_rate": error_rate,
+        "empty_terms": frozenset(empty_terms),
+        "tags": list(tags),
+        "packages": list(packages),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ckan-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/data"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the data.gov.ma CKAN API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument("--tags", type=str, default=None, help="JSON list served by tag_list (e.g. datasets/tags.json).")
+    args = parser.parse_args()
+
+    tags = []
+    if args.tags:
+        with open(args.tags, "r", encoding="utf-8") as f:
+            tags = json.load(f)
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms, args.error_rate, tags=tags,
+                                         packages=[tag.replace(" ", "-") for tag in tags])
+    print(f"Stub CKAN API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
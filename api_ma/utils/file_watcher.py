@@ -1,19 +1,128 @@
-from watchdog.events import FileSystemEventHandler
 import asyncio
+import os
+import time
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 from utils.logging_config import logger
 
 
-class TokenFileHandler(FileSystemEventHandler):
-    def __init__(self, initialize_tokens, load_configuration ):
+class ConfigFileHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
         super().__init__()
-        self.loop = asyncio.get_event_loop()
-        self.initialize_tokens = initialize_tokens
-        self.load_configuration = load_configuration
+        self.watcher = watcher
 
+    # Only writes, creations, renames and attribute changes (the touch of broadcast()) count:
+    # reading the files during a reload emits open/close events, which must not trigger another reload
     def on_modified(self, event):
-        if event.src_path.endswith("tokens.env"):
-            logger.info("tokens.env has been modified, reloading tokens...")
-            asyncio.run_coroutine_threadsafe(self.initialize_tokens(), self.loop)
-        elif event.src_path.endswith("config.env"):
-            logger.info("config.env has been modified, reloading configuration...")
-            asyncio.run_coroutine_threadsafe(self.load_configuration(), self.loop)
\ No newline at end of file
+        if not event.is_directory:
+            self.watcher.file_changed(event.src_path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.file_changed(event.src_path)
+
+    def on_moved(self, event):
+        # Editors often write a temporary file and rename it over the original
+        if not event.is_directory:
+            self.watcher.file_changed(event.dest_path)
+
+
+class ConfigWatcher:
+    """Reloads configuration files on the event loop when they change.
+
+    The directory of the files is watched with the native file system events
+    (inotify on Linux) rather than by polling, and only events on the
+    configured file names are kept. A burst of events (write, rename, touch)
+    is debounced into a single reload, which runs on the event loop passed
+    to start(), in the order of reloaders.
+    """
+
+    def __init__(self, reloaders, directory=".", debounce=1.0):
+        self.reloaders = reloaders
+        self.directory = directory
+        self.debounce = debounce
+        self.loop = None
+        self.last_reload = None
+        self._observer = None
+        self._lock = None
+        self._pending = set()
+        self._timer = None
+        self._muted_until = 0.0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Await callback(names) after each reload, names being the reloaded files."""
+        self._listeners.append(callback)
+
+    def start(self, loop):
+        """Watch the files and reload them on loop; call it in each worker, after the fork."""
+        if self._observer is not None:
+            return
+        self.loop = loop
+        self._lock = asyncio.Lock()
+        observer = Observer()
+        observer.schedule(ConfigFileHandler(self), path=self.directory, recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        logger.info(f"Watching {', '.join(self.reloaders)} for configuration changes")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def file_changed(self, path):
+        # Called on the observer thread, everything else happens on the event loop
+        name = os.path.basename(path)
+        if name in self.reloaders and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._schedule, name)
+
+    def _schedule(self, name):
+        if self.loop.time() < self._muted_until:
+            return
+        self._pending.add(name)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self.loop.call_later(self.debounce, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        names, self._pending = self._pending, set()
+        self.loop.create_task(self.reload(names))
+
+    def trigger(self):
+        """Reload every file, e.g. from a SIGHUP handler on the event loop."""
+        self.loop.create_task(self.reload())
+
+    async def reload(self, names=None):
+        names = [name for name in self.reloaders if names is None or name in names]
+        async with self._lock:
+            for name in names:
+                logger.info(f"{name} has been modified, reloading...")
+                try:
+                    await self.reloaders[name]()
+                except Exception as e:
+                    logger.error(f"An error occurred while reloading {name}: {e}")
+            for callback in self._listeners:
+                try:
+                    await callback(names)
+                except Exception as e:
+                    logger.error(f"An error occurred in a configuration reload listener: {e}")
+            self.last_reload = time.time()
+        return names
+
+    def broadcast(self):
+        """Touch the files so that the watchers of the other workers reload them too.
+
+        The events this causes in the current worker are ignored, it is
+        expected to have reloaded already.
+        """
+        self._muted_until = self.loop.time() + self.debounce
+        for name in self.reloaders:
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                os.utime(path)
@@ -1,34 +1,212 @@
+import atexit
+import copy
+import json
 import logging
+import multiprocessing
 import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import (BaseRotatingHandler, QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler, WatchedFileHandler)
+from dotenv import load_dotenv
+from utils.request_context import request_labels
 
+load_dotenv("config.env")
 
+# Attributes every LogRecord has; anything else on a record was passed through extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+CONTEXT_FIELDS = ("request_id", "endpoint", "lang")
 
-def setup_logging(log_file='app.log'):
+
+class RequestContextFilter(logging.Filter):
+    """Copy the labels of the current request onto the record, before it leaves the request's thread."""
+
+    def filter(self, record):
+        labels = request_labels.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, labels[field] if labels is not None else None)
+        return True
+
+
+class SuccessSampler(logging.Filter):
+    """Keep only a share of the records logged with extra={"sample": True}."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, "sample", False) or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key != "sample" and value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ProcessQueueHandler(QueueHandler):
+    """Puts records on a queue drained by a listener thread, so callers never wait for disk or console I/O.
+
+    The listener is stopped (after draining the queue) around a fork, since a
+    child forked while the thread writes inherits half-flushed stream buffers;
+    each process then restarts its own listener on its first record. A forked
+    child also moves its rotating file handlers to a file of its own (see
+    process_log_file).
+    """
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._restart = False
+        os.register_at_fork(before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+                            after_in_child=self._after_fork_in_child)
+
+    def _before_fork(self):
+        self._start_lock.acquire()
+        self._restart = self.listener is not None
+        self._stop_listener()
+
+    def _after_fork_in_parent(self):
+        try:
+            if self._restart:
+                self._start_listener()
+        finally:
+            self._start_lock.release()
+
+    def _after_fork_in_child(self):
+        self._start_lock = threading.Lock()
+        self.listener = None
+        for handler in self.handlers:
+            if isinstance(handler, BaseRotatingHandler):
+                use_process_file(handler)
+
+    def prepare(self, record):
+        # Render the message and the traceback on the caller's thread, the listener only formats.
+        # The extra= fields are kept on the record for the JSON formatter.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if self.listener is None:
+            with self._start_lock:
+                if self.listener is None:
+                    self._start_listener()
+        super().emit(record)
+
+    def _start_listener(self):
+        if self._pid != os.getpid():
+            # Records queued before a fork belong to the parent
+            self.queue = queue.SimpleQueue()
+            self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _stop_listener(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def stop(self):
+        """Write the records still on the queue and stop the listener thread."""
+        with self._start_lock:
+            self._stop_listener()
+
+
+def process_log_file(log_file):
+    """app.log -> app.<pid>.log: a rotating handler only knows about its own writes, two processes
+    rotating the same file lose records or write them into each other's backups."""
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def use_process_file(handler):
+    """Point a handler inherited through a fork at the file of the current process."""
+    shared = getattr(handler, "shared_filename", handler.baseFilename)
+    if handler.stream is not None:
+        handler.stream.close()
+        handler.stream = None
+    handler.shared_filename = shared
+    handler.baseFilename = process_log_file(shared)
+
+
+def file_handler(log_file):
+    """File handler: rotated by size (LOG_ROTATION=size), at a time interval (LOG_ROTATION=time),
+    or by an external tool such as logrotate (LOG_ROTATION=external), every process then sharing the file.
+
+    With size or time rotation each worker writes its own file, the workers
+    spawned by uvicorn from here and the ones forked by gunicorn in
+    ProcessQueueHandler; files are opened on the first record.
+    """
+    rotation = os.getenv("LOG_ROTATION", "size").lower()
+    if rotation == "external":
+        return WatchedFileHandler(log_file, encoding="utf-8", delay=True)
+    if multiprocessing.parent_process() is not None:
+        log_file = process_log_file(log_file)
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    if rotation == "time":
+        return TimedRotatingFileHandler(log_file, when=os.getenv("LOG_ROTATE_WHEN", "midnight"),
+                                        backupCount=backup_count, encoding="utf-8", delay=True)
+    return RotatingFileHandler(log_file, maxBytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+                               backupCount=backup_count, encoding="utf-8", delay=True)
+
+
+def setup_logging(log_file=None):
+    log_file = log_file or os.getenv("LOG_FILE", "app.log")
 
     # Create a logger
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)  # Set the logging level
+    logger.setLevel(os.getenv("LOGGING_LEVEL", "INFO").upper())
+    logger.propagate = False
 
-    # Create a formatter that includes the date and time
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    # JSON records by default, LOG_FORMAT=text for the former human readable lines
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    else:
+        formatter = JsonFormatter()
 
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [logging.StreamHandler(), file_handler(log_file)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
 
-    # Create file handler, appending to the log file
-    file_handler = logging.FileHandler(log_file, mode='a')  # 'a' for append mode
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    # Ensure the log file is in the same directory as the script
-    if not os.path.exists(log_file):
-        with open(log_file, 'w'):  # Create the file if it doesn't exist
-            pass
+    queue_handler = ProcessQueueHandler(handlers)
+    queue_handler.addFilter(SuccessSampler(float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1"))))
+    queue_handler.addFilter(RequestContextFilter())
+    logger.addHandler(queue_handler)
 
+    # Flush the records still on the queue when the process exits
+    atexit.register(queue_handler.stop)
     return logger
 
+
+def stop_logging():
+    for handler in logger.handlers:
+        if isinstance(handler, ProcessQueueHandler):
+            handler.stop()
+
+
 # Create a logger instance using the setup_logging function
 logger = setup_logging()
 
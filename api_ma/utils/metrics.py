@@ -0,0 +1,100 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, ProcessCollector, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from utils.logging_config import logger
+from utils.request_context import add_timing, current_labels
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of the query pipeline",
+    ["stage", "endpoint", "lang"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds",
+    "End to end request latency",
+    ["endpoint", "lang", "status"],
+    buckets=STAGE_BUCKETS,
+)
+
+
+def observe_stage(name, seconds):
+    endpoint, lang = current_labels()
+    STAGE_SECONDS.labels(name, endpoint, lang).observe(seconds)
+    add_timing(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+class StatsCollector:
+    """Gauges computed at scrape time from the stats() of queues and caches."""
+
+    def __init__(self):
+        self.gauges = {}
+        self.caches = {}
+
+    def add_gauge(self, name, documentation, read):
+        self.gauges[name] = (documentation, read)
+
+    def add_cache(self, name, read_stats):
+        """read_stats returns {cache label: {"hits": ..., "misses": ...}}, or None when the cache is not in use."""
+        self.caches[name] = read_stats
+
+    def collect(self):
+        for name, (documentation, read) in self.gauges.items():
+            try:
+                yield GaugeMetricFamily(name, documentation, value=read())
+            except Exception as e:
+                logger.error(f"An error occurred while reading metric {name}: {e}")
+
+        hit_ratio = GaugeMetricFamily("chatbot_cache_hit_ratio", "Hit rate of the caches", labels=["cache"])
+        lookups = GaugeMetricFamily("chatbot_cache_lookups", "Lookups of the caches since startup", labels=["cache", "result"])
+        for name, read_stats in self.caches.items():
+            try:
+                stats = read_stats()
+            except Exception as e:
+                logger.error(f"An error occurred while reading the stats of cache {name}: {e}")
+                continue
+            if not stats:
+                continue
+            for cache, values in stats.items():
+                hits, misses = values.get("hits", 0), values.get("misses", 0)
+                hit_ratio.add_metric([cache], hits / (hits + misses) if hits + misses else 0.0)
+                lookups.add_metric([cache, "hit"], hits)
+                lookups.add_metric([cache, "miss"], misses)
+        yield hit_ratio
+        yield lookups
+
+
+collector = StatsCollector()
+REGISTRY.register(collector)
+
+
+def render_metrics():
+    """Exposition of the default registry (which includes process RSS and CPU), or of
+    every worker when PROMETHEUS_MULTIPROC_DIR is set (run_api.sh sets it).
+
+    In the multiprocess case the histograms are summed over the workers, while
+    the process_* metrics and the gauges of StatsCollector (queues, caches) are
+    those of the worker answering the scrape, like any per-process state.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        ProcessCollector(registry=registry)
+        registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
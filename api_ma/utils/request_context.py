@@ -0,0 +1,37 @@
+import contextvars
+
+# Labels and timings of the request being served. The dict is shared (not copied)
+# with the threads that run the request, so the endpoint can fill in the language
+# and every stage can add its timing as the request goes.
+request_labels = contextvars.ContextVar("request_labels", default=None)
+
+
+def start_request(endpoint, request_id=None):
+    """Start a labelled request context, returns the token to reset it."""
+    return request_labels.set({"endpoint": endpoint, "lang": "none", "request_id": request_id, "timings": {}, "fields": {}})
+
+
+def set_lang(lang):
+    labels = request_labels.get()
+    if labels is not None:
+        labels["lang"] = lang
+
+
+def current_labels():
+    labels = request_labels.get()
+    return (labels["endpoint"], labels["lang"]) if labels is not None else ("background", "none")
+
+
+def add_timing(name, seconds):
+    """Add seconds to the time spent in name by the current request, reported in its access log."""
+    labels = request_labels.get()
+    if labels is not None:
+        timings = labels["timings"]
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def annotate(**fields):
+    """Extra fields for the access log of the current request."""
+    labels = request_labels.get()
+    if labels is not None:
+        labels["fields"].update(fields)
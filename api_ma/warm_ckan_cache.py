@@ -0,0 +1,54 @@
+import argparse
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from utils.logging_config import logger
+
+try:
+    load_dotenv('config.env')
+except Exception as e:
+    logger.error(f" {e}")
+    sys.exit(1)
+
+from services.ckan_client import ckan_client
+from services.ckan_cache import MemoryBackend
+
+
+def load_tags(path_data):
+    """Load the tag strings of the tags dataset."""
+    with open(path_data, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [item["text"] if isinstance(item, dict) else item for item in data]
+
+
+def warm_up(path_data, langs, chunk_size):
+    if ckan_client.cache is None:
+        print("CKAN_CACHE_BACKEND is 'none', nothing to warm up.")
+        return
+    if isinstance(ckan_client.cache.backend, MemoryBackend):
+        print("Warning: the memory backend is per process, set CKAN_CACHE_BACKEND=sqlite to share the warm cache.")
+
+    tags = load_tags(path_data)
+    for lang in langs:
+        start = time.perf_counter()
+        found = 0
+        for i in range(0, len(tags), chunk_size):
+            chunk = tags[i:i + chunk_size]
+            results = ckan_client.search_many_sync(chunk, lang, timeout=ckan_client.timeout * len(chunk))
+            found += sum(1 for result in results if result[-1])
+            print(f"[{lang}] {min(i + chunk_size, len(tags))}/{len(tags)} tags")
+        elapsed = time.perf_counter() - start
+        logger.info(f"CKAN cache warmed for '{lang}': {found}/{len(tags)} tags with datasets in {elapsed:.1f}s")
+    ckan_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch package_search results of every tag into the CKAN cache.")
+    parser.add_argument("--path_data", type=str, default=os.getenv("TAGS_DATASET_PATH"), help="Path of the tags dataset.")
+    parser.add_argument("--langs", type=str, nargs="+", default=["fr", "ar"], help="Languages to prefetch.")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Number of tags fetched concurrently.")
+    args = parser.parse_args()
+
+    warm_up(args.path_data, args.langs, args.chunk_size)